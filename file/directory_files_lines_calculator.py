@@ -1,6 +1,15 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
 from datetime import datetime
-import os
+from typing import Iterable, Iterator, Optional, TextIO, Union
+import subprocess
+import threading
+import argparse
+import sqlite3
+import json
+import csv
 import sys
+import os
 
 
 DEFAULT_EXCLUDED_FILE_EXT_LIST: list[str] = [
@@ -24,102 +33,812 @@ DEFAULT_EXCLUDED_DIR_LIST: list[str] = [
 ]
 
 
+READ_BUFFER_SIZE: int = 1024 * 1024
+
+OUTPUT_BUFFER_SIZE: int = 1024 * 1024
+
+DEFAULT_WORKERS: int = min(32, (os.cpu_count() or 1) + 4)
+
+CACHE_SCHEMA_VERSION: int = 3
+
+
+# Language -> (line comment prefixes, (block start, block end) pairs)
+LANGUAGE_SYNTAX: dict[str, tuple[tuple[bytes, ...], tuple[tuple[bytes, bytes], ...]]] = {
+    "Python": ((b"#",), ((b'"""', b'"""'), (b"'''", b"'''"))),
+    "C": ((b"//",), ((b"/*", b"*/"),)),
+    "C++": ((b"//",), ((b"/*", b"*/"),)),
+    "C#": ((b"//",), ((b"/*", b"*/"),)),
+    "Java": ((b"//",), ((b"/*", b"*/"),)),
+    "Kotlin": ((b"//",), ((b"/*", b"*/"),)),
+    "Go": ((b"//",), ((b"/*", b"*/"),)),
+    "Rust": ((b"//",), ((b"/*", b"*/"),)),
+    "Swift": ((b"//",), ((b"/*", b"*/"),)),
+    "JavaScript": ((b"//",), ((b"/*", b"*/"),)),
+    "TypeScript": ((b"//",), ((b"/*", b"*/"),)),
+    "CSS": ((), ((b"/*", b"*/"),)),
+    "PHP": ((b"//", b"#"), ((b"/*", b"*/"),)),
+    "SQL": ((b"--",), ((b"/*", b"*/"),)),
+    "Lua": ((b"--",), ((b"--[[", b"]]"),)),
+    "Ruby": ((b"#",), ((b"=begin", b"=end"),)),
+    "Shell": ((b"#",), ()),
+    "PowerShell": ((b"#",), ((b"<#", b"#>"),)),
+    "Makefile": ((b"#",), ()),
+    "Dockerfile": ((b"#",), ()),
+    "YAML": ((b"#",), ()),
+    "TOML": ((b"#",), ()),
+    "INI": ((b";", b"#"), ()),
+    "HTML": ((), ((b"<!--", b"-->"),)),
+    "XML": ((), ((b"<!--", b"-->"),)),
+    "Markdown": ((), ((b"<!--", b"-->"),)),
+    "Text": ((), ()),
+}
+
+
+LANGUAGE_EXTENSIONS: dict[str, str] = {
+    "py": "Python", "pyi": "Python", "pyw": "Python",
+    "c": "C", "h": "C",
+    "cc": "C++", "cpp": "C++", "cxx": "C++", "hh": "C++", "hpp": "C++", "hxx": "C++",
+    "cs": "C#",
+    "java": "Java",
+    "kt": "Kotlin", "kts": "Kotlin",
+    "go": "Go",
+    "rs": "Rust",
+    "swift": "Swift",
+    "js": "JavaScript", "mjs": "JavaScript", "cjs": "JavaScript", "jsx": "JavaScript",
+    "ts": "TypeScript", "tsx": "TypeScript",
+    "css": "CSS", "scss": "CSS",
+    "php": "PHP",
+    "sql": "SQL",
+    "lua": "Lua",
+    "rb": "Ruby",
+    "sh": "Shell", "bash": "Shell", "zsh": "Shell",
+    "ps1": "PowerShell", "psm1": "PowerShell",
+    "mk": "Makefile",
+    "yml": "YAML", "yaml": "YAML",
+    "toml": "TOML",
+    "ini": "INI", "cfg": "INI", "conf": "INI",
+    "html": "HTML", "htm": "HTML",
+    "xml": "XML", "svg": "XML",
+    "md": "Markdown", "markdown": "Markdown",
+    "txt": "Text", "rst": "Text",
+}
+
+
+LANGUAGE_FILENAMES: dict[str, str] = {
+    "Makefile": "Makefile",
+    "makefile": "Makefile",
+    "Dockerfile": "Dockerfile",
+}
+
+
+# Line kinds produced by classify_chunks
+CODE_LINE, COMMENT_LINE, BLANK_LINE = range(3)
+
+# (lines, code, comment, blank); the last three are None when not classified
+FileCounts = tuple[int, Optional[int], Optional[int], Optional[int]]
+
+
 def get_Info_logging_string(content: str) -> str:
     return f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - RUNTIME_INFO - {content}"
 
 
+def count_newlines(file_path: str) -> int:
+    """
+    Count lines without decoding: b"\\n" occurrences over large binary
+    reads, plus one for a last line without a trailing newline.
+    """
+    return count_chunk_newlines(iter_file_chunks(file_path))
+
+
 def count_lines_in_file(file_path: str) -> int:
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return sum(1 for _ in file)
-    except UnicodeDecodeError:
-        try:
-            with open(file_path, 'r', encoding='latin-1') as file:
-                return sum(1 for _ in file)
-        except Exception as e:
-            print(get_Info_logging_string(f"Unable to read file {file_path}: {e}"))
-            return 0
+        return count_newlines(file_path)
     except Exception as e:
-        print(get_Info_logging_string(f"Error reading file {file_path}: {e}"))
+        print(get_Info_logging_string(f"Error reading file {file_path}: {e}"), file=sys.stderr)
         return 0
 
 
-def count_lines_in_directory(
+def detect_language(file_name: str) -> str:
+    language = LANGUAGE_FILENAMES.get(file_name)
+    if language is not None:
+        return language
+    _, dot, ext = file_name.rpartition(".")
+    return LANGUAGE_EXTENSIONS.get(ext.lower(), "Other") if dot else "Other"
+
+
+def iter_file_chunks(file_path: str) -> Iterator[bytes]:
+    with open(file_path, 'rb', buffering=0) as file:
+        while chunk := file.read(READ_BUFFER_SIZE):
+            yield chunk
+
+
+def count_chunk_newlines(chunks: Iterable[bytes]) -> int:
+    lines: int = 0
+    last_byte: bytes = b"\n"
+    for chunk in chunks:
+        lines += chunk.count(b"\n")
+        last_byte = chunk[-1:] or last_byte
+    return lines + (last_byte != b"\n")
+
+
+def classify_lines(file_path: str, language: str) -> tuple[int, int, int]:
+    return classify_chunks(iter_file_chunks(file_path), language)
+
+
+def classify_chunks(chunks: Iterable[bytes], language: str) -> tuple[int, int, int]:
+    """
+    Split raw bytes into (code, comment, blank) lines in one pass.
+    Comments are recognised at the start of a line only, and a line
+    mixing code with a comment counts as code.
+
+    Lines are classified in place as the chunks arrive: a line spanning
+    chunks only carries its first few stripped bytes, the open block
+    comment terminator and the bytes that may start a split terminator,
+    so long or newline-free lines cost linear time and bounded memory.
+    """
+    line_comments, block_comments = LANGUAGE_SYNTAX.get(language, ((), ()))
+    # Bytes of stripped text needed to recognise every comment marker
+    block_starts = tuple(start for start, _ in block_comments)
+    lead_size = max((len(marker) for marker in line_comments + block_starts), default=1)
+    rest_size = max((len(marker) for marker in line_comments), default=1)
+    counts = [0, 0, 0]  # indexed by CODE_LINE, COMMENT_LINE, BLANK_LINE
+
+    # State of the current line, reset at every newline
+    block_end: Optional[bytes] = None  # terminator of the open block comment
+    searching = False  # looking for block_end on this line
+    window = b""  # tail of the searched bytes that may begin a split block_end
+    nonblank = False  # any non-whitespace byte seen while searching
+    head = b""  # leading stripped bytes, not yet enough to classify
+    after_close = False  # head is the text following a closed block comment
+    kind: Optional[int] = None  # set once the rest of the line cannot matter
+
+    def scan(data: bytes, end_of_line: bool) -> None:
+        nonlocal block_end, searching, window, nonblank, head, after_close, kind
+        while kind is None:
+            if searching:
+                if not nonblank and data:
+                    nonblank = not data.isspace()
+                data = window + data
+                close = data.find(block_end)
+                if close < 0:
+                    if end_of_line:
+                        kind = COMMENT_LINE if nonblank else BLANK_LINE
+                    else:
+                        window = data[max(0, len(data) - len(block_end) + 1):]
+                    return
+                data = data[close + len(block_end):]
+                block_end, searching, window, after_close = None, False, b"", True
+                continue
+
+            head += data.lstrip() if not head else data
+            if not end_of_line and len(head) < (rest_size if after_close else lead_size):
+                return
+            data, head = head, b""
+            if after_close:
+                kind = CODE_LINE if data and not data.startswith(line_comments) else COMMENT_LINE
+                return
+            if not data:
+                kind = BLANK_LINE
+                return
+            for start, end in block_comments:
+                if data.startswith(start):
+                    data = data[len(start):]
+                    block_end, searching, nonblank = end, True, True
+                    break
+            else:
+                kind = COMMENT_LINE if data.startswith(line_comments) else CODE_LINE
+
+    pending = False  # the current line began in an earlier chunk
+    for chunk in chunks:
+        lines = chunk.split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            if not pending and block_end is None:
+                # Whole line outside a block comment: no state to carry
+                stripped = line.strip()
+                if not stripped:
+                    counts[BLANK_LINE] += 1
+                    continue
+                if not stripped.startswith(block_starts):
+                    counts[COMMENT_LINE if stripped.startswith(line_comments) else CODE_LINE] += 1
+                    continue
+            scan(line, True)
+            counts[kind] += 1
+            searching, nonblank, window, head, after_close, kind = block_end is not None, False, b"", b"", False, None
+            pending = False
+        if tail:
+            scan(tail, False)
+            pending = True
+    if pending:
+        scan(b"", True)
+        counts[kind] += 1
+
+    return counts[CODE_LINE], counts[COMMENT_LINE], counts[BLANK_LINE]
+
+
+def count_file(file_path: str, sloc: bool = False) -> FileCounts:
+    if not sloc:
+        return count_newlines(file_path), None, None, None
+    code, comment, blank = classify_lines(file_path, detect_language(os.path.basename(file_path)))
+    return code + comment + blank, code, comment, blank
+
+
+def count_chunks(chunks: Iterable[bytes], file_name: str, sloc: bool = False) -> FileCounts:
+    if not sloc:
+        return count_chunk_newlines(chunks), None, None, None
+    code, comment, blank = classify_chunks(chunks, detect_language(file_name))
+    return code + comment + blank, code, comment, blank
+
+
+class LineCounts:
+    """ Running totals for a language or a directory """
+
+    __slots__ = ("files", "lines", "code", "comment", "blank")
+
+    def __init__(self):
+        self.files: int = 0
+        self.lines: int = 0
+        self.code: int = 0
+        self.comment: int = 0
+        self.blank: int = 0
+
+    def add(self, counts: FileCounts) -> None:
+        lines, code, comment, blank = counts
+        self.files += 1
+        self.lines += lines
+        if code is not None:
+            self.code += code
+            self.comment += comment
+            self.blank += blank
+
+    def describe(self, sloc: bool) -> str:
+        text = f"{self.files} files, {self.lines} lines"
+        if sloc:
+            text += f" ({self.code} code, {self.comment} comment, {self.blank} blank)"
+        return text
+
+    def as_record(self, sloc: bool) -> dict:
+        record = {"files": self.files, "lines": self.lines}
+        if sloc:
+            record.update(code=self.code, comment=self.comment, blank=self.blank)
+        return record
+
+
+def describe_file_counts(counts: FileCounts) -> str:
+    lines, code, comment, blank = counts
+    if code is None:
+        return f"{lines} lines"
+    return f"{lines} lines ({code} code, {comment} comment, {blank} blank)"
+
+
+def file_counts_record(counts: FileCounts) -> dict:
+    lines, code, comment, blank = counts
+    record = {"lines": lines}
+    if code is not None:
+        record.update(code=code, comment=comment, blank=blank)
+    return record
+
+
+class TextReporter:
+    """ The timestamped log layout; quiet keeps only the summary """
+
+    def __init__(self, stream: TextIO, sloc: bool = False, quiet: bool = False):
+        self.stream = stream
+        self.sloc = sloc
+        self.quiet = quiet
+
+    def _log(self, content: str) -> None:
+        self.stream.write(get_Info_logging_string(content) + "\n")
+
+    def start(self, dir_path: str) -> None:
+        if self.quiet:
+            return
+        self._log(f"Counting lines in directory: {os.path.abspath(dir_path)}")
+        self._log("Mode: Recursively process all subdirectories")
+        self.stream.write("-" * 60 + "\n")
+
+    def file(self, rel_path: str, language: str, counts: FileCounts) -> None:
+        self._log(f"{rel_path}: {describe_file_counts(counts)}")
+
+    def directory(self, rel_dir: str, counts: LineCounts) -> None:
+        if rel_dir == ".":
+            return
+        self._log(f"[{rel_dir}/]: {counts.describe(self.sloc)}")
+        self.stream.write("-" * 40 + "\n")
+
+    def finish(
+            self, dir_count: int, languages: dict[str, LineCounts], totals: LineCounts,
+            cache_hits: Optional[int]
+        ) -> None:
+        if not self.quiet:
+            self.stream.write("=" * 60 + "\n")
+        for language, counts in sorted(languages.items(), key=lambda item: item[1].lines, reverse=True):
+            self._log(f"{language}: {counts.describe(self.sloc)}")
+        self._log(f"Total: {dir_count} directories, {totals.describe(self.sloc)}")
+        if cache_hits is not None and not self.quiet:
+            self._log(f"Cache: {cache_hits} files unchanged, {totals.files - cache_hits} files read")
+
+
+class NdjsonReporter:
+    """
+    One JSON record per line: "file" and "directory" records as counting
+    goes, then "language" and "total" records. Quiet drops the first two.
+    """
+
+    def __init__(self, stream: TextIO, sloc: bool = False, quiet: bool = False):
+        self.stream = stream
+        self.sloc = sloc
+        self.quiet = quiet
+
+    def _emit(self, record: dict) -> None:
+        self.stream.write(json.dumps(record) + "\n")
+
+    def start(self, dir_path: str) -> None:
+        pass
+
+    def file(self, rel_path: str, language: str, counts: FileCounts) -> None:
+        self._emit({"type": "file", "path": rel_path, "language": language, **file_counts_record(counts)})
+
+    def directory(self, rel_dir: str, counts: LineCounts) -> None:
+        self._emit({"type": "directory", "path": rel_dir, **counts.as_record(self.sloc)})
+
+    def finish(
+            self, dir_count: int, languages: dict[str, LineCounts], totals: LineCounts,
+            cache_hits: Optional[int]
+        ) -> None:
+        for language, counts in sorted(languages.items(), key=lambda item: item[1].lines, reverse=True):
+            self._emit({"type": "language", "language": language, **counts.as_record(self.sloc)})
+        self._emit({"type": "total", "directories": dir_count, **totals.as_record(self.sloc)})
+
+
+class CsvReporter(NdjsonReporter):
+    """ The NDJSON records as CSV rows under one fixed header """
+
+    FIELDS: list[str] = [
+        "type", "path", "language", "directories", "files", "lines", "code", "comment", "blank"
+    ]
+
+    def __init__(self, stream: TextIO, sloc: bool = False, quiet: bool = False):
+        super().__init__(stream, sloc, quiet)
+        self._writer = csv.DictWriter(stream, self.FIELDS, lineterminator="\n")
+
+    def _emit(self, record: dict) -> None:
+        self._writer.writerow(record)
+
+    def start(self, dir_path: str) -> None:
+        self._writer.writeheader()
+
+
+class JsonReporter(NdjsonReporter):
+    """ The NDJSON records collected into a single JSON document """
+
+    SECTIONS: dict[str, str] = {"file": "files", "directory": "directories", "language": "languages"}
+
+    def start(self, dir_path: str) -> None:
+        self._document = {
+            "root": os.path.abspath(dir_path), "files": [], "directories": [], "languages": []
+        }
+
+    def _emit(self, record: dict) -> None:
+        kind = record.pop("type")
+        if kind == "total":
+            self._document["total"] = record
+        else:
+            self._document[self.SECTIONS[kind]].append(record)
+
+    def finish(self, *args) -> None:
+        super().finish(*args)
+        json.dump(self._document, self.stream, indent=2)
+        self.stream.write("\n")
+
+
+REPORTERS: dict[str, type] = {
+    "text": TextReporter,
+    "json": JsonReporter,
+    "csv": CsvReporter,
+    "ndjson": NdjsonReporter,
+}
+
+
+def get_default_cache_path() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "pyopstools", "line_counts.sqlite3")
+
+
+class LineCountCache:
+    """
+    Per-file line counts in SQLite, keyed by absolute path and validated
+    by size, mtime_ns and inode. The rows under the counted directory are
+    loaded up front so lookups are dict hits; new counts are written back
+    in a single transaction on close(). SLOC columns stay NULL until a
+    file has been classified.
+
+    Paths are stored as their raw bytes (os.fsencode), so names that are
+    not valid UTF-8 round-trip. A cache that cannot be read or written
+    only costs speed: failures are reported and the count goes on.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path: str = cache_path or get_default_cache_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        self._connection = sqlite3.connect(self.cache_path)
+        self._entries: dict[bytes, tuple] = {}
+        self._updates: list[tuple] = []
+        self.hits: int = 0
+
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != CACHE_SCHEMA_VERSION:
+            self._connection.execute("DROP TABLE IF EXISTS line_counts")
+            self._connection.execute(f"PRAGMA user_version = {CACHE_SCHEMA_VERSION}")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS line_counts ("
+            "path BLOB PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, "
+            "lines INTEGER, code INTEGER, comment INTEGER, blank INTEGER)"
+        )
+
+    def load(self, dir_path: str) -> None:
+        prefix = os.fsencode(os.path.join(os.path.abspath(dir_path), ""))
+        # BLOBs compare bytewise: every path below prefix sorts before the
+        # prefix with its trailing separator byte incremented
+        upper = prefix[:-1] + bytes((prefix[-1] + 1,))
+        try:
+            rows = self._connection.execute(
+                "SELECT path, size, mtime_ns, inode, lines, code, comment, blank "
+                "FROM line_counts WHERE path >= ? AND path < ?",
+                (prefix, upper),
+            )
+            self._entries = {row[0]: row[1:] for row in rows}
+        except sqlite3.Error as e:
+            print(get_Info_logging_string(f"Unable to read line count cache {self.cache_path}: {e}"), file=sys.stderr)
+            self._entries = {}
+
+    def get(self, file_path: str, stat: os.stat_result, sloc: bool = False) -> Optional[FileCounts]:
+        entry = self._entries.get(os.fsencode(os.path.abspath(file_path)))
+        if entry is None or entry[:3] != (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+            return None
+        if sloc and entry[4] is None:
+            return None
+        self.hits += 1
+        return entry[3:] if sloc else (entry[3], None, None, None)
+
+    def put(self, file_path: str, stat: os.stat_result, counts: FileCounts) -> None:
+        self._updates.append(
+            (os.fsencode(os.path.abspath(file_path)), stat.st_size, stat.st_mtime_ns, stat.st_ino, *counts)
+        )
+
+    def close(self) -> None:
+        try:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO line_counts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._updates
+                )
+        except sqlite3.Error as e:
+            print(get_Info_logging_string(f"Unable to update line count cache {self.cache_path}: {e}"), file=sys.stderr)
+        finally:
+            self._connection.close()
+            self._updates.clear()
+
+
+def iter_directory_files(
         dir_path: str, rel_exclude_dirs: list[str], exclude_file_exts: list[str]
-    ) -> None:
+    ) -> Iterator[tuple[str, str]]:
+    """
+    Yield (directory, file path) pairs top-down, one directory at a time,
+    using os.scandir so file/dir types come from the cached DirEntry data.
+    """
+    excluded_dirs = set(rel_exclude_dirs)
+    excluded_exts = tuple(exclude_file_exts)
+    pending: list[str] = [dir_path]
 
-    if not os.path.isdir(dir_path):
-        print(get_Info_logging_string(f"Error: {dir_path} is not a valid directory"))
-        return
-    
-    print(
-        get_Info_logging_string(f"Counting lines in directory: {os.path.abspath(dir_path)}")
+    while pending:
+        root = pending.pop()
+        subdirs: list[str] = []
+        try:
+            with os.scandir(root) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in excluded_dirs:
+                            subdirs.append(entry.path)
+                    elif entry.is_file() and not entry.name.endswith(excluded_exts):
+                        yield root, entry.path
+        except OSError as e:
+            print(get_Info_logging_string(f"Unable to read directory {root}: {e}"), file=sys.stderr)
+        pending.extend(reversed(subdirs))
+
+
+def run_git(dir_path: str, args: list[str]) -> bytes:
+    try:
+        result = subprocess.run(["git", "-C", dir_path, *args], capture_output=True, check=True)
+    except FileNotFoundError:
+        raise RuntimeError("Git is not installed or is not in the PATH")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"git {args[0]} failed: {e.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def group_by_directory(dir_path: str, entries: dict[str, str]) -> list[tuple[str, str, str]]:
+    """
+    (directory, file path, blob id) triples from list_git_entries, sorted
+    so each directory's files are contiguous
+    """
+    return [
+        (os.path.join(dir_path, rel_dir), os.path.join(dir_path, rel_dir, name), blob)
+        for (rel_dir, name), blob in sorted((os.path.split(rel_path), blob) for rel_path, blob in entries.items())
+    ]
+
+
+def list_git_entries(
+        dir_path: str, exclude_file_exts: list[str], revision: Optional[str] = None
+    ) -> dict[str, str]:
+    """
+    Map regular files tracked under dir_path (relative path -> blob id),
+    from the index via `git ls-files -s`, or from the tree of revision via
+    `git ls-tree -r`. Symlinks and submodules are left out.
+    """
+    if revision is None:
+        output = run_git(dir_path, ["ls-files", "-z", "-s"])
+    else:
+        output = run_git(dir_path, ["ls-tree", "-r", "-z", revision])
+
+    excluded_exts = tuple(exclude_file_exts)
+    entries: dict[str, str] = {}
+    for record in output.split(b"\0"):
+        if not record:
+            continue
+        meta, _, path = record.partition(b"\t")
+        fields = meta.split()
+        mode, blob = fields[0], fields[1] if revision is None else fields[2]
+        rel_path = os.fsdecode(path)
+        if mode in (b"100644", b"100755") and not rel_path.endswith(excluded_exts):
+            entries[rel_path] = blob.decode()
+    return entries
+
+
+def iter_git_files(dir_path: str, exclude_file_exts: list[str]) -> Iterator[tuple[str, str]]:
+    """
+    Yield (directory, file path) pairs for the files git tracks under
+    dir_path, in place of walking the tree: untracked build output never
+    shows up, so the excluded directory list is not needed.
+    """
+    for root, file_path, _ in group_by_directory(dir_path, list_git_entries(dir_path, exclude_file_exts)):
+        yield root, file_path
+
+
+def iter_blob_chunks(stream, size: int) -> Iterator[bytes]:
+    while size > 0:
+        chunk = stream.read(min(size, READ_BUFFER_SIZE))
+        if not chunk:
+            raise RuntimeError("git cat-file output ended early")
+        size -= len(chunk)
+        yield chunk
+
+
+def count_lines_at_revision(
+        dir_path: str, revision: str, exclude_file_exts: list[str], sloc: bool = False
+    ) -> Iterator[tuple[str, str, FileCounts]]:
+    """
+    Count the files of a commit without checking it out: blob ids from
+    `git ls-tree` are fed to one `git cat-file --batch` process and each
+    blob is counted as it streams back.
+    """
+    files = group_by_directory(dir_path, list_git_entries(dir_path, exclude_file_exts, revision))
+    process = subprocess.Popen(
+        ["git", "-C", dir_path, "cat-file", "--batch"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=READ_BUFFER_SIZE
     )
-    print(get_Info_logging_string("Mode: Recursively process all subdirectories"))
-    print("-" * 60)
-    
-    total_lines: int = 0
-    file_count: int = 0
-    dir_count: int = 0
-    
-    for root, dirs, files in os.walk(dir_path):
-        dirs[:] = [ d for d in dirs if d not in rel_exclude_dirs ]
-        
-        current_dir_lines: int = 0
-        current_dir_files: int = 0
-        
-        for filename in files:
-            file_path = os.path.join(root, filename)
-            
-            if any(filename.endswith(ext) for ext in exclude_file_exts):
+
+    def feed() -> None:
+        # stdin must be closed whatever happens, or cat-file keeps waiting
+        # and the reader below blocks in readline(); it reports short output
+        try:
+            for _, _, blob in files:
+                process.stdin.write(blob.encode() + b"\n")
+        except Exception:
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    # Feeding from a thread keeps both pipes moving, however large the blobs
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        for root, file_path, _ in files:
+            header = process.stdout.readline().split()
+            if len(header) != 3 or header[1] != b"blob":
+                raise RuntimeError(f"git cat-file: unexpected reply {b' '.join(header).decode(errors='replace')}")
+            counts = count_chunks(
+                iter_blob_chunks(process.stdout, int(header[2])), os.path.basename(file_path), sloc
+            )
+            process.stdout.read(1)
+            yield root, file_path, counts
+    finally:
+        process.kill()
+        process.wait()
+        feeder.join()
+
+
+def count_lines_parallel(
+        files: Iterator[tuple[str, str]], workers: int,
+        cache: Optional[LineCountCache] = None, sloc: bool = False
+    ) -> Iterator[tuple[str, str, FileCounts]]:
+    """
+    Count files on a thread pool (the reads release the GIL) and yield
+    (directory, file path, counts) in input order, with a bounded number
+    of files in flight. Files the cache has seen unchanged are not read.
+    """
+    failed: FileCounts = (0, 0, 0, 0) if sloc else (0, None, None, None)
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    window: int = workers * 8
+    in_flight: deque = deque()
+
+    def resolve(root, file_path, stat, pending) -> tuple[str, str, FileCounts]:
+        if isinstance(pending, tuple):
+            return root, file_path, pending
+        try:
+            counts = pending.result() if pending is not None else count_file(file_path, sloc)
+        except Exception as e:
+            print(get_Info_logging_string(f"Error reading file {file_path}: {e}"), file=sys.stderr)
+            return root, file_path, failed
+        if cache is not None and stat is not None:
+            cache.put(file_path, stat, counts)
+        return root, file_path, counts
+
+    try:
+        for root, file_path in files:
+            stat: Optional[os.stat_result] = None
+            pending: Union[FileCounts, Future, None] = None
+            if cache is not None:
+                try:
+                    stat = os.stat(file_path)
+                    pending = cache.get(file_path, stat, sloc)
+                except OSError:
+                    pass
+
+            if executor is None:
+                yield resolve(root, file_path, stat, pending)
                 continue
-                
-            lines = count_lines_in_file(file_path)
-            
-            rel_path = os.path.relpath(file_path, dir_path)
-            print(get_Info_logging_string(f"{rel_path}: {lines} lines"))
-            
-            current_dir_lines += lines
-            current_dir_files += 1
-            total_lines += lines
-            file_count += 1
-        
-        if current_dir_files > 0:
-            dir_count += 1
-            if root != dir_path:
-                rel_dir = os.path.relpath(root, dir_path)
-
-                print(
-                    get_Info_logging_string(
-                        f"[{rel_dir}/]: {current_dir_files} files"
-                    )
-                )
-                print("-" * 40)
-    
-    print("=" * 60)
-    print(
-        get_Info_logging_string(
-            f"Total: {dir_count} directories, {file_count} files, {total_lines} lines"
+
+            if pending is None:
+                pending = executor.submit(count_file, file_path, sloc)
+            in_flight.append((root, file_path, stat, pending))
+            if len(in_flight) >= window:
+                yield resolve(*in_flight.popleft())
+
+        while in_flight:
+            yield resolve(*in_flight.popleft())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def count_lines_in_directory(
+        dir_path: str, rel_exclude_dirs: list[str], exclude_file_exts: list[str],
+        workers: int = DEFAULT_WORKERS, cache: Optional[LineCountCache] = None,
+        sloc: bool = False, output_format: str = "text", quiet: bool = False,
+        stream: Optional[TextIO] = None, git: bool = False, revision: Optional[str] = None
+    ) -> Optional[LineCounts]:
+    """
+    Count every file under dir_path and report through the reporter for
+    output_format. quiet skips the per-file and per-directory records, so
+    nothing is formatted until the summary. With git only tracked files
+    are counted, and with a revision they are read from that commit
+    instead of the working tree. Returns the totals.
+    """
+    if not os.path.isdir(dir_path):
+        print(get_Info_logging_string(f"Error: {dir_path} is not a valid directory"), file=sys.stderr)
+        return None
+
+    reporter = REPORTERS[output_format](stream or sys.stdout, sloc, quiet)
+    reporter.start(dir_path)
+
+    totals = LineCounts()
+    languages: dict[str, LineCounts] = {}
+    dir_count: int = 0
+
+    if revision is not None:
+        results = count_lines_at_revision(dir_path, revision, exclude_file_exts, sloc)
+    else:
+        if cache is not None:
+            cache.load(dir_path)
+        files = (
+            iter_git_files(dir_path, exclude_file_exts) if git
+            else iter_directory_files(dir_path, rel_exclude_dirs, exclude_file_exts)
+        )
+        results = count_lines_parallel(files, workers, cache, sloc)
+
+    current_root: Optional[str] = None
+    current_dir = LineCounts()
+
+    def finish_directory(root: Optional[str], counts: LineCounts) -> int:
+        if counts.files == 0:
+            return 0
+        if not quiet:
+            reporter.directory(os.path.relpath(root, dir_path), counts)
+        return 1
+
+    for root, file_path, counts in results:
+        if root != current_root:
+            dir_count += finish_directory(current_root, current_dir)
+            current_root, current_dir = root, LineCounts()
+
+        language = detect_language(os.path.basename(file_path))
+        if not quiet:
+            reporter.file(os.path.relpath(file_path, dir_path), language, counts)
+
+        if language not in languages:
+            languages[language] = LineCounts()
+        languages[language].add(counts)
+        current_dir.add(counts)
+        totals.add(counts)
+
+    dir_count += finish_directory(current_root, current_dir)
+
+    cache_hits = cache.hits if cache is not None and revision is None else None
+    reporter.finish(dir_count, languages, totals, cache_hits)
+    return totals
+
+
+def open_output(path: Optional[str]) -> TextIO:
+    """
+    A large-buffered text stream on the output file, or on stdout for None
+    / "-". File names that are not valid UTF-8 are written as their raw
+    bytes (surrogateescape) instead of failing the report.
+    """
+    if path is None or path == "-":
+        return open(
+            sys.stdout.fileno(), "w", buffering=OUTPUT_BUFFER_SIZE, encoding="utf-8",
+            errors="surrogateescape", closefd=False
         )
+    return open(
+        path, "w", buffering=OUTPUT_BUFFER_SIZE, encoding="utf-8", errors="surrogateescape", newline=""
     )
 
 
 def main() -> None:
-    directory: str = "."
-    
-    if len(sys.argv) > 1:
-        for arg in sys.argv[1:]:
-            if not arg.startswith('-'):
-                directory = arg
-            else:
-                print(get_Info_logging_string(f"Unknown option: {arg}"))
-                print(get_Info_logging_string("Usage: python script.py [dir_path]"))
-                return
-    
-    count_lines_in_directory(
-        directory, DEFAULT_EXCLUDED_DIR_LIST, DEFAULT_EXCLUDED_FILE_EXT_LIST
-        )
+    parser = argparse.ArgumentParser(description="Count lines of files in a directory tree")
+    parser.add_argument("dir_path", nargs="?", default=".", help="Directory to count (default: .)")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Counting threads (default: {DEFAULT_WORKERS})")
+    parser.add_argument("-s", "--sloc", action="store_true",
+                        help="Classify lines as code, comment or blank per language")
+    parser.add_argument("-f", "--format", choices=sorted(REPORTERS), default="text",
+                        help="Output format (default: text)")
+    parser.add_argument("-o", "--output", default=None, help="Write the report to this file (default: stdout)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Only report per-language and overall totals")
+    parser.add_argument("-g", "--git", action="store_true",
+                        help="Count only the files tracked by git instead of walking the tree")
+    parser.add_argument("-r", "--revision", default=None,
+                        help="Count the tracked files as of this commit, without checking it out (implies --git)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Read every file instead of reusing counts of unchanged files")
+    parser.add_argument("--cache-path", default=None,
+                        help="SQLite cache file (default: $XDG_CACHE_HOME/pyopstools/line_counts.sqlite3)")
+    args = parser.parse_args()
+
+    cache = None
+    if not (args.no_cache or args.revision):
+        try:
+            cache = LineCountCache(args.cache_path)
+        except (OSError, sqlite3.Error) as e:
+            print(get_Info_logging_string(f"Line count cache disabled: {e}"), file=sys.stderr)
+    try:
+        with open_output(args.output) as stream:
+            count_lines_in_directory(
+                args.dir_path, DEFAULT_EXCLUDED_DIR_LIST, DEFAULT_EXCLUDED_FILE_EXT_LIST,
+                args.workers, cache, args.sloc, args.format, args.quiet, stream,
+                args.git, args.revision
+                )
+    except RuntimeError as e:
+        print(get_Info_logging_string(f"Error: {e}"), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if cache is not None:
+            cache.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
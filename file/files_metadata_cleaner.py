@@ -1,79 +1,294 @@
-from PIL.PngImagePlugin import PngImageFile
-from PIL import Image
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import deque
+from zipfile import ZipFile
+import argparse
+import tempfile
 import shutil
-import glob
+import time
 import os
 
 
+# APP1 (EXIF / XMP), APP13 (Photoshop IRB / IPTC) and COM segments
+JPEG_METADATA_MARKERS = frozenset((0xE1, 0xED, 0xFE))
+JPEG_SOS_MARKER = 0xDA
+JPEG_EOI_MARKER = 0xD9
 
-def picture_exif_data_handle(image_path):
-    try:
-        image = Image.open(image_path)
-
-        if image.format == "JPEG":
-            image_data = image.getdata()
-            clean_image = Image.new(image.mode, image.size)
-            clean_image.putdata(image_data)
-            clean_image.save(image_path, "JPEG")
-        elif image.format == "PNG":
-            if isinstance(image, PngImageFile):
-                image.save(image_path, "PNG")
-    except Exception as e:
-        print(f"无法处理文件 {image_path}: {e}")
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_METADATA_CHUNKS = frozenset((b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME"))
+
+# The only Info entry PdfFileWriter puts in the files it writes
+PDF_WRITER_PRODUCER = "PyPDF2"
+
+DOCX_METADATA_PARTS = frozenset(("docProps/app.xml", "docProps/core.xml"))
+
+# Images are dispatched on their magic bytes, documents on the extension
+IMAGE_EXTENSIONS = frozenset((".jpg", ".jpeg", ".png", ".gif", ".bmp"))
+DOCUMENT_TYPES = {
+    ".pdf": "pdf",
+    ".docx": "docx",
+}
 
 
-def document_metadata_handle(file_path):
+@contextmanager
+def rewrite_atomically(file_path):
+    """ Yield a temp file next to file_path that replaces it on success """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    tmp_path = None
     try:
-        if file_path.lower().endswith(".pdf"):
-            from PyPDF2 import PdfFileReader, PdfFileWriter
+        with tempfile.NamedTemporaryFile('wb', dir=directory, prefix='.metadata_', delete=False) as target:
+            tmp_path = target.name
+            yield target
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+        tmp_path = None
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def strip_jpeg_metadata(image_path):
+    """
+    Drop the EXIF, XMP, IPTC and comment segments by copying every other
+    segment and the entropy-coded data byte for byte, so the image is not
+    decoded or re-compressed. Returns True if the file changed.
+    """
+    with open(image_path, 'rb') as file:
+        data = memoryview(file.read())
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("not a JPEG file")
+
+    kept = [data[:2]]
+    changed = False
+    position = 2
+    while True:
+        if position + 2 > len(data) or data[position] != 0xFF:
+            raise ValueError("corrupt JPEG segment")
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker in (JPEG_SOS_MARKER, JPEG_EOI_MARKER):
+            kept.append(data[position:])
+            break
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            kept.append(data[position:position + 2])
+            position += 2
+            continue
+
+        end = position + 2 + int.from_bytes(data[position + 2:position + 4], 'big')
+        if marker in JPEG_METADATA_MARKERS:
+            changed = True
+        else:
+            kept.append(data[position:end])
+        position = end
+
+    if changed:
+        with rewrite_atomically(image_path) as target:
+            target.writelines(kept)
+    return changed
+
+
+def strip_png_metadata(image_path):
+    """ Drop text, EXIF and timestamp chunks, copying the others as they are """
+    with open(image_path, 'rb') as file:
+        data = memoryview(file.read())
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError("not a PNG file")
+
+    kept = [data[:8]]
+    changed = False
+    position = 8
+    while position + 12 <= len(data):
+        length = int.from_bytes(data[position:position + 4], 'big')
+        chunk_type = data[position + 4:position + 8].tobytes()
+        end = position + 12 + length
+        if chunk_type in PNG_METADATA_CHUNKS:
+            changed = True
+        else:
+            kept.append(data[position:end])
+        position = end
+        if chunk_type == b"IEND":
+            break
+
+    if changed:
+        with rewrite_atomically(image_path) as target:
+            target.writelines(kept)
+    return changed
+
+
+def strip_pdf_metadata(file_path):
+    """
+    Rebuild the PDF from its pages only, dropping the document's Info
+    dictionary and XMP stream. PdfFileWriter always writes a new Info
+    dictionary holding just its own /Producer, so a file that carries
+    nothing else is already clean and is left alone.
+    """
+    from PyPDF2 import PdfFileReader, PdfFileWriter
+
+    with open(file_path, 'rb') as source:
+        pdf_reader = PdfFileReader(source)
+        info = pdf_reader.trailer.get("/Info")
+        info = {} if info is None else info.getObject()
+        has_metadata = "/Metadata" in pdf_reader.trailer["/Root"] or any(
+            key != "/Producer" or value != PDF_WRITER_PRODUCER for key, value in info.items())
+        if not has_metadata:
+            return False
+        pdf_writer = PdfFileWriter()
 
-            pdf_reader = PdfFileReader(file_path)
-            pdf_writer = PdfFileWriter()
+        for page_num in range(pdf_reader.getNumPages()):
+            pdf_writer.addPage(pdf_reader.getPage(page_num))
 
+        with rewrite_atomically(file_path) as target:
+            pdf_writer.write(target)
+    return True
 
-            for page_num in range(pdf_reader.getNumPages()):
-                page = pdf_reader.getPage(page_num)
-                pdf_writer.addPage(page)
 
-            with open(file_path, "wb") as output_pdf:
-                pdf_writer.write(output_pdf)
+def strip_docx_metadata(file_path):
+    """ Copy every part except docProps/app.xml and core.xml into a new archive """
+    with ZipFile(file_path, 'r') as source:
+        entries = source.infolist()
+        if not any(entry.filename in DOCX_METADATA_PARTS for entry in entries):
+            return False
 
+        with rewrite_atomically(file_path) as target, ZipFile(target, 'w') as output_docx:
+            for entry in entries:
+                if entry.filename not in DOCX_METADATA_PARTS:
+                    output_docx.writestr(entry, source.read(entry))
+    return True
 
-        elif file_path.lower().endswith(".docx"):
-            from zipfile import ZipFile
 
-            with ZipFile(file_path, 'r') as docx:
+TYPE_HANDLERS = {
+    "jpeg": strip_jpeg_metadata,
+    "png": strip_png_metadata,
+    "pdf": strip_pdf_metadata,
+    "docx": strip_docx_metadata,
+}
 
-                docx.extractall("temp_docx")
-                xml_files = ["temp_docx/docProps/app.xml", "temp_docx/docProps/core.xml"]
-                for xml_file in xml_files:
-                    if os.path.exists(xml_file):
-                        os.remove(xml_file)
-                with ZipFile(file_path, 'w') as output_docx:
-                    for folder_name, subfolders, filenames in os.walk("temp_docx"):
-                        for filename in filenames:
-                            output_docx.write(os.path.join(folder_name, filename),
-                                              os.path.relpath(os.path.join(folder_name, filename),
-                                                             "temp_docx"))
 
-            shutil.rmtree("temp_docx")
+def detect_file_type(file_path):
+    """
+    The TYPE_HANDLERS key for a file, or None when there is nothing to
+    strip. Images are told apart by content, so a JPEG saved as .png still
+    reaches the JPEG handler.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in IMAGE_EXTENSIONS:
+        return DOCUMENT_TYPES.get(extension)
+
+    with open(file_path, 'rb') as file:
+        signature = file.read(8)
+    if signature[:2] == b"\xff\xd8":
+        return "jpeg"
+    if signature == PNG_SIGNATURE:
+        return "png"
+    return None
+
+
+def iter_files(target_directory):
+    """ Yield file paths top-down with os.scandir, without building a full list """
+    pending = [target_directory]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path
+        except OSError as e:
+            print(f"无法读取目录 {directory}: {e}")
+
+
+def clean_file(file_path):
+    """
+    Detect the type and run its handler; returns (file type, changed,
+    seconds, error), with a None type for files that were skipped
+    """
+    started = time.perf_counter()
+    file_type = None
+    try:
+        file_type = detect_file_type(file_path)
+        if file_type is None:
+            return None, False, 0.0, None
+        changed = TYPE_HANDLERS[file_type](file_path)
+        return file_type, changed, time.perf_counter() - started, None
     except Exception as e:
-        print(f"无法处理文件 {file_path}: {e}")
+        return file_type or "unknown", False, time.perf_counter() - started, e
+
+
+def is_candidate(file_path):
+    extension = os.path.splitext(file_path)[1].lower()
+    return extension in IMAGE_EXTENSIONS or extension in DOCUMENT_TYPES
+
+
+def print_timing_summary(stats, skipped, elapsed):
+    print("=" * 60)
+    print(f"{'类型':<8}{'文件':>10}{'已清理':>10}{'失败':>8}{'耗时(s)':>12}{'平均(ms)':>12}")
+    for file_type, (files, changed, failed, seconds) in sorted(stats.items()):
+        print(f"{file_type:<8}{files:>10}{changed:>10}{failed:>8}{seconds:>12.2f}{seconds / files * 1000:>12.2f}")
+    print(f"跳过的其他文件: {skipped}")
+    print(f"总耗时: {elapsed:.2f}s")
+
+
+def process_directory(target_directory, workers=1):
+    """
+    Stream paths from os.scandir to the handler for their type (images by
+    magic bytes, documents by extension). With more than one worker the
+    handlers run on a thread pool with a bounded number of files in
+    flight. Ends with a per-type timing summary.
+    """
+    started = time.perf_counter()
+    stats = {}
+    skipped = 0
+
+    def record(file_path, result):
+        nonlocal skipped
+        file_type, changed, seconds, error = result
+        if file_type is None:
+            skipped += 1
+            return
+        files, changed_count, failed, total = stats.get(file_type, (0, 0, 0, 0.0))
+        if error is not None:
+            print(f"无法处理文件 {file_path}: {error}")
+        elif changed:
+            print(f"已清理: {file_path}")
+        stats[file_type] = (files + 1, changed_count + bool(changed), failed + (error is not None), total + seconds)
+
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    in_flight = deque()
+    try:
+        for file_path in iter_files(target_directory):
+            if not is_candidate(file_path):
+                skipped += 1
+                continue
+
+            if executor is None:
+                record(file_path, clean_file(file_path))
+                continue
+
+            in_flight.append((file_path, executor.submit(clean_file, file_path)))
+            if len(in_flight) >= workers * 8:
+                file_path, future = in_flight.popleft()
+                record(file_path, future.result())
 
+        while in_flight:
+            file_path, future = in_flight.popleft()
+            record(file_path, future.result())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
-def process_directory(target_directory):
-    for file_path in glob.glob(os.path.join(target_directory, '**', '*'), recursive=True):
-        if os.path.isfile(file_path):
-            if file_path.lower().endswith(('jpg', 'jpeg', 'png', 'gif', 'bmp')):
-                print(f"正在处理图片文件: {file_path}")
-                picture_exif_data_handle(file_path)
+    print_timing_summary(stats, skipped, time.perf_counter() - started)
+    return stats
 
-            else:
-                print(f"正在处理文件: {file_path}")
-                document_metadata_handle(file_path)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Strip metadata from images and documents in a directory tree")
+    parser.add_argument("target_directory", help="Directory to clean recursively")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Handler threads (default: 1, no pool)")
+    args = parser.parse_args()
 
-    target_directory = r""
-    process_directory(target_directory)
+    process_directory(args.target_directory, args.workers)
@@ -0,0 +1,135 @@
+from image_directory_scanner import scan_image_files
+from typing import Iterator, Optional
+from PIL import Image
+import argparse
+import json
+
+
+DHASH_SIZE: int = 8
+
+
+def image_dhash(fpath: str, hash_size: int = DHASH_SIZE) -> int:
+    """
+    Difference hash: compare neighbouring pixels of a tiny grayscale
+    thumbnail. JPEGs are draft-decoded at 1/8 scale, so only a fraction of
+    the source is ever decompressed.
+    """
+    with Image.open(fpath) as img:
+        img.draft("RGB", (hash_size * 8, hash_size * 8))
+        return dhash_image(img, hash_size)
+
+
+def dhash_image(img: Image.Image, hash_size: int = DHASH_SIZE) -> int:
+    """ The dHash of an already opened (or pre-reduced) image """
+    if img.mode not in ("L", "RGB", "RGBA"):
+        img = img.convert("RGB")
+    pixels = img.resize(
+        (hash_size + 1, hash_size), Image.BILINEAR, reducing_gap=2.0
+    ).convert("L").tobytes()
+
+    value = 0
+    row_len = hash_size + 1
+    for row in range(hash_size):
+        offset = row * row_len
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class NearDuplicateIndex:
+    """
+    BK-tree over perceptual hashes with Hamming distance as the metric.
+    find_or_add keeps the first image of every near-duplicate group as
+    its representative, so it can run over a stream of sources.
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        # node: [hash, key, {distance: child node}]
+        self._root: Optional[list] = None
+        self.groups: dict[str, list[str]] = {}
+
+    def find(self, value: int) -> Optional[str]:
+        """Return the key of the closest indexed hash within threshold, or None"""
+        if self._root is None:
+            return None
+
+        best_key, best_distance = None, self.threshold + 1
+        pending = [self._root]
+        while pending:
+            node_value, node_key, children = pending.pop()
+            distance = hamming_distance(value, node_value)
+            if distance < best_distance:
+                best_key, best_distance = node_key, distance
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) <= self.threshold:
+                    pending.append(child)
+        return best_key
+
+    def add(self, value: int, key: str) -> None:
+        node = [value, key, {}]
+        if self._root is None:
+            self._root = node
+            return
+
+        current = self._root
+        while True:
+            distance = hamming_distance(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def find_or_add(self, value: int, key: str) -> Optional[str]:
+        """Return the representative key if value is a near-duplicate, else index it"""
+        match = self.find(value)
+        if match is None:
+            self.add(value, key)
+        else:
+            self.groups.setdefault(match, []).append(key)
+        return match
+
+    def report(self) -> dict:
+        return {
+            "threshold": self.threshold,
+            "groups": [
+                {"kept": kept, "duplicates": duplicates}
+                for kept, duplicates in self.groups.items()
+            ],
+        }
+
+    def save_report(self, report_path: str) -> None:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+
+
+def find_near_duplicates(
+    dirpath: str, threshold: int, extensions: tuple = (".png", ".jpg", ".jpeg", ".webp"),
+    recursive: bool = True,
+) -> Iterator[tuple[str, Optional[str]]]:
+    """Yield (relative path, representative or None) for every image under dirpath"""
+    index = NearDuplicateIndex(threshold)
+    for fpath, rel_path in scan_image_files(dirpath, extensions, recursive):
+        try:
+            value = image_dhash(fpath)
+        except Exception as e:
+            print(f"\033[31mCannot hash {rel_path}: {e}\033[0m")
+            continue
+        yield rel_path, index.find_or_add(value, rel_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Group near-duplicate images by perceptual hash")
+    parser.add_argument("dirpath", help="Directory containing images")
+    parser.add_argument("-t", "--threshold", type=int, default=4,
+                        help="Max Hamming distance between 64-bit dHashes (default: 4)")
+    args = parser.parse_args()
+
+    for rel_path, representative in find_near_duplicates(args.dirpath, args.threshold):
+        if representative is not None:
+            print(f"{rel_path} ~ {representative}")
@@ -0,0 +1,43 @@
+from typing import Iterable, Iterator
+import os
+
+
+def scan_image_files(
+    dirpath: str,
+    extensions: Iterable[str],
+    recursive: bool = True,
+    exclude_dirpaths: Iterable[str] = (),
+) -> Iterator[tuple[str, str]]:
+    """
+    Stream (path, relative path) pairs for files under dirpath whose
+    extension is in extensions (e.g. (".png", ".jpg"), case-insensitive).
+
+    Built on os.scandir: the file/dir type comes from the cached DirEntry
+    data, so no extra stat call is made per entry. Only one directory
+    listing is held in memory at a time; entries are sorted by name within
+    each directory so the output order is deterministic.
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    excluded = {os.path.realpath(p) for p in exclude_dirpaths}
+    pending: list[tuple[str, str]] = [(dirpath, "")]
+
+    while pending:
+        current_dir, rel_dir = pending.pop()
+        try:
+            with os.scandir(current_dir) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f"\033[31mCannot read directory {current_dir}: {e}\033[0m")
+            continue
+
+        subdirs: list[tuple[str, str]] = []
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if recursive and os.path.realpath(entry.path) not in excluded:
+                    subdirs.append((entry.path, rel_path))
+            elif entry.name.lower().endswith(extensions) and entry.is_file():
+                yield entry.path, rel_path
+
+        # Reversed so the stack pops subdirectories in name order
+        pending.extend(reversed(subdirs))
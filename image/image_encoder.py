@@ -0,0 +1,159 @@
+from typing import NamedTuple, Optional
+from PIL import Image, features
+import argparse
+import time
+import io
+import os
+
+
+FORMAT_EXTENSIONS: dict[str, str] = {
+    "jpeg": ".jpg",
+    "webp": ".webp",
+    "avif": ".avif",
+}
+
+# Named presets per format, ordered from fastest encode to smallest output.
+# "max" keeps near-lossless quality for archival copies.
+ENCODER_PRESETS: dict[str, dict[str, dict]] = {
+    "jpeg": {
+        "fast": {"quality": 80, "optimize": False, "progressive": False, "subsampling": "4:2:0"},
+        "balanced": {"quality": 85, "optimize": True, "progressive": True, "subsampling": "4:2:0"},
+        "small": {"quality": 75, "optimize": True, "progressive": True, "subsampling": "4:2:0"},
+        "max": {"quality": 95, "optimize": True, "progressive": True, "subsampling": "4:4:4"},
+    },
+    "webp": {
+        "fast": {"quality": 80, "method": 0},
+        "balanced": {"quality": 80, "method": 4},
+        "small": {"quality": 72, "method": 6},
+        "max": {"quality": 95, "method": 4},
+    },
+    "avif": {
+        "fast": {"quality": 60, "speed": 10},
+        "balanced": {"quality": 60, "speed": 6},
+        "small": {"quality": 50, "speed": 4},
+        "max": {"quality": 85, "speed": 6},
+    },
+}
+
+PRESET_NAMES: list[str] = list(ENCODER_PRESETS["jpeg"])
+
+
+class EncodeResult(NamedTuple):
+    output_bytes: int
+    encode_seconds: float
+
+
+def available_formats() -> list[str]:
+    """Formats whose codec is compiled into (or plugged into) this Pillow"""
+    formats = ["jpeg"]
+    if features.check("webp"):
+        formats.append("webp")
+    if features.check("avif"):
+        formats.append("avif")
+    else:
+        try:
+            import pillow_avif  # noqa: F401  registers the AVIF plugin
+            formats.append("avif")
+        except ImportError:
+            pass
+    return formats
+
+
+def encoder_options(fmt: str, preset: str, quality: Optional[int] = None) -> dict:
+    if fmt not in ENCODER_PRESETS:
+        raise ValueError(f"Unsupported output format: {fmt}")
+    if preset not in ENCODER_PRESETS[fmt]:
+        raise ValueError(f"Unknown preset '{preset}', expected one of {PRESET_NAMES}")
+
+    options = dict(ENCODER_PRESETS[fmt][preset])
+    if quality is not None:
+        options["quality"] = quality
+        if fmt == "jpeg" and quality >= 95:
+            options["subsampling"] = "4:4:4"
+    return options
+
+
+def encode_image(
+    image: Image.Image, fmt: str = "jpeg", preset: str = "balanced",
+    quality: Optional[int] = None, target=None,
+) -> EncodeResult:
+    """
+    Encode image with the named preset into target (a path or binary file
+    object). quality overrides the preset's quality. Alpha is flattened
+    for JPEG and kept for WebP/AVIF.
+    """
+    options = encoder_options(fmt, preset, quality)
+
+    if fmt == "jpeg" or image.mode not in ("RGB", "RGBA"):
+        has_alpha = fmt != "jpeg" and ("A" in image.mode or "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    output = target if target is not None else io.BytesIO()
+    start_time = time.perf_counter()
+    image.save(output, fmt.upper(), **options)
+    elapsed = time.perf_counter() - start_time
+
+    if isinstance(output, (str, os.PathLike)):
+        size = os.path.getsize(output)
+    else:
+        size = output.tell()
+    return EncodeResult(size, elapsed)
+
+
+class EncodeStats:
+    """Per-format totals of source bytes, output bytes and encode time"""
+
+    def __init__(self):
+        self.totals: dict[str, list] = {}
+
+    def add(self, fmt: str, source_bytes: int, result: EncodeResult) -> None:
+        total = self.totals.setdefault(fmt, [0, 0, 0, 0.0])
+        total[0] += 1
+        total[1] += source_bytes
+        total[2] += result.output_bytes
+        total[3] += result.encode_seconds
+
+    def report(self) -> None:
+        for fmt, (files, source_bytes, output_bytes, seconds) in sorted(self.totals.items()):
+            saved = source_bytes - output_bytes
+            ratio = saved / source_bytes * 100 if source_bytes else 0.0
+            print(
+                f"[{fmt}] {files} files, {source_bytes / 1e6:.2f} MB -> {output_bytes / 1e6:.2f} MB "
+                f"(saved {saved / 1e6:.2f} MB, {ratio:.1f}%), encode time {seconds:.2f}s"
+            )
+
+
+def compare_presets(image_paths: list[str], formats: list[str]) -> None:
+    """Encode every sample with every format/preset pair and print a size/time table"""
+    rows: dict[tuple[str, str], list] = {}
+    source_bytes = 0
+    for image_path in image_paths:
+        source_bytes += os.path.getsize(image_path)
+        with Image.open(image_path) as img:
+            img.load()
+            for fmt in formats:
+                for preset in PRESET_NAMES:
+                    result = encode_image(img, fmt, preset)
+                    row = rows.setdefault((fmt, preset), [0, 0.0])
+                    row[0] += result.output_bytes
+                    row[1] += result.encode_seconds
+
+    print(f"{len(image_paths)} samples, {source_bytes / 1e6:.2f} MB source")
+    print(f"{'format':<8}{'preset':<10}{'output MB':>12}{'encode s':>12}")
+    print("-" * 42)
+    for (fmt, preset), (output_bytes, seconds) in sorted(rows.items(), key=lambda r: r[1][0]):
+        print(f"{fmt:<8}{preset:<10}{output_bytes / 1e6:>12.3f}{seconds:>12.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare output formats and encoder presets on sample images")
+    parser.add_argument("images", nargs="+", help="Sample image files")
+    parser.add_argument("-f", "--formats", nargs="+", choices=list(FORMAT_EXTENSIONS),
+                        default=None, help="Formats to compare (default: all available)")
+    args = parser.parse_args()
+
+    formats = args.formats or available_formats()
+    missing = set(formats) - set(available_formats())
+    if missing:
+        parser.error(f"Codec not available in this Pillow build: {', '.join(sorted(missing))}")
+    compare_presets(args.images, formats)
@@ -0,0 +1,220 @@
+from typing import BinaryIO, Iterator, Optional
+from PIL import Image
+import struct
+import zlib
+import io
+
+
+PNG_SIGNATURE: bytes = b"\x89PNG\r\n\x1a\n"
+
+# 8-bit color types whose raw scanlines match Pillow's tobytes() layout:
+# color type -> bytes per pixel
+STRIP_COLOR_TYPES: dict[int, int] = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Chunks before IDAT that a band needs to decode the same way as the source
+BAND_COPIED_CHUNKS: tuple[bytes, ...] = (b"PLTE", b"tRNS")
+
+BAND_WRITE_SIZE: int = 1024 * 1024
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data)) + chunk_type + data
+        + struct.pack(">I", zlib.crc32(chunk_type + data))
+    )
+
+
+class PngStripReader:
+    """
+    Decode a non-interlaced 8-bit PNG in horizontal bands without ever
+    holding the full image in memory.
+
+    The IDAT stream is inflated incrementally, and every band of filtered
+    scanlines is wrapped into a tiny in-memory PNG (prefixed with the
+    previous band's last unfiltered row) so that Pillow's C code does the
+    unfiltering. Peak memory is a small multiple of the band size.
+    """
+
+    def __init__(self, fpath: str):
+        self._file: BinaryIO = open(fpath, "rb")
+        self._extra_chunks: list[bytes] = []
+        self._pending_idat: Optional[bytes] = None
+        try:
+            self._read_header()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _read_chunk(self) -> tuple[bytes, bytes]:
+        header = self._file.read(8)
+        if len(header) < 8:
+            raise ValueError("Truncated PNG file")
+        length, chunk_type = struct.unpack(">I4s", header)
+        data = self._file.read(length)
+        self._file.read(4)  # CRC, the band decoder recomputes its own
+        if len(data) < length:
+            raise ValueError("Truncated PNG file")
+        return chunk_type, data
+
+    def _read_header(self) -> None:
+        if self._file.read(8) != PNG_SIGNATURE:
+            raise ValueError("Not a PNG file")
+
+        chunk_type, data = self._read_chunk()
+        if chunk_type != b"IHDR":
+            raise ValueError("PNG file does not start with IHDR")
+        (
+            self.width, self.height, self.bit_depth, self.color_type,
+            _, _, self.interlace,
+        ) = struct.unpack(">IIBBBBB", data)
+
+        while True:
+            chunk_type, data = self._read_chunk()
+            if chunk_type == b"IDAT":
+                self._pending_idat = data
+                return
+            if chunk_type == b"IEND":
+                raise ValueError("PNG file has no image data")
+            if chunk_type in BAND_COPIED_CHUNKS:
+                self._extra_chunks.append(_png_chunk(chunk_type, data))
+
+    @property
+    def supported(self) -> bool:
+        return (
+            self.bit_depth == 8
+            and self.color_type in STRIP_COLOR_TYPES
+            and self.interlace == 0
+        )
+
+    @property
+    def stride(self) -> int:
+        return self.width * STRIP_COLOR_TYPES.get(self.color_type, 0)
+
+    def _iter_idat(self) -> Iterator[bytes]:
+        if self._pending_idat is not None:
+            data, self._pending_idat = self._pending_idat, None
+            yield data
+        while True:
+            chunk_type, data = self._read_chunk()
+            if chunk_type != b"IDAT":
+                return
+            yield data
+
+    def _decode_band(self, previous_row: bytes, filtered_rows: memoryview, rows: int) -> Image.Image:
+        ihdr = struct.pack(
+            ">IIBBBBB", self.width, rows + 1, self.bit_depth, self.color_type, 0, 0, 0
+        )
+        band_png = io.BytesIO()
+        band_png.write(PNG_SIGNATURE)
+        band_png.write(_png_chunk(b"IHDR", ihdr))
+        for chunk in self._extra_chunks:
+            band_png.write(chunk)
+
+        # The IDAT is streamed straight into the buffer, its length is
+        # patched afterwards. Level 0 only frames the rows as stored
+        # deflate blocks, there is no compression work.
+        idat_offset = band_png.tell()
+        band_png.write(b"\x00\x00\x00\x00IDAT")
+        crc = zlib.crc32(b"IDAT")
+        compressor = zlib.compressobj(0)
+        rows_data = [b"\x00" + previous_row] + [
+            filtered_rows[start:start + BAND_WRITE_SIZE]
+            for start in range(0, len(filtered_rows), BAND_WRITE_SIZE)
+        ]
+        for data in rows_data:
+            piece = compressor.compress(data)
+            band_png.write(piece)
+            crc = zlib.crc32(piece, crc)
+        piece = compressor.flush()
+        band_png.write(piece)
+        crc = zlib.crc32(piece, crc)
+        idat_length = band_png.tell() - idat_offset - 8
+        band_png.write(struct.pack(">I", crc))
+        band_png.write(_png_chunk(b"IEND", b""))
+        band_png.seek(idat_offset)
+        band_png.write(struct.pack(">I", idat_length))
+        band_png.seek(0)
+
+        band = Image.open(band_png)
+        band.load()
+        band_png.close()
+        return band
+
+    def iter_bands(self, band_rows: int) -> Iterator[tuple[Image.Image, tuple[int, int, int, int]]]:
+        """
+        Yield (band, box) for consecutive bands of at most band_rows rows,
+        top to bottom. Row 0 of every band image is the previous band's last
+        row; box is the region holding this band's own rows, so callers can
+        pass it to reduce()/crop() without an extra copy.
+        """
+        if not self.supported:
+            raise ValueError("Only non-interlaced 8-bit PNGs can be read in strips")
+
+        row_bytes = self.stride + 1
+        decompressor = zlib.decompressobj()
+        idat_chunks = self._iter_idat()
+        buffer = bytearray()
+        tail = b""
+        # The first scanline is filtered against an all-zero row
+        previous_row = bytes(self.stride)
+
+        y = 0
+        while y < self.height:
+            rows = min(band_rows, self.height - y)
+            need = rows * row_bytes
+            while len(buffer) < need:
+                if not tail:
+                    tail = next(idat_chunks, None)
+                    if tail is None:
+                        raise ValueError("PNG image data ends early")
+                buffer += decompressor.decompress(tail, need - len(buffer))
+                tail = decompressor.unconsumed_tail
+
+            with memoryview(buffer) as view:
+                band = self._decode_band(previous_row, view[:need], rows)
+            del buffer[:need]
+
+            previous_row = band.crop((0, rows, self.width, rows + 1)).tobytes()
+            yield band, (0, 1, self.width, rows + 1)
+            band.close()
+            y += rows
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "PngStripReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def reduce_png_in_strips(fpath: str, factor: int, max_band_bytes: int) -> Image.Image:
+    """
+    Box-reduce a PNG by an integer factor band by band. Bands are a
+    multiple of factor rows tall, so the result is identical to
+    Image.reduce(factor) on the whole image.
+    """
+    with PngStripReader(fpath) as reader:
+        # raw rows, the stored-deflate copy and the decoded band coexist
+        rows_in_budget = max_band_bytes // (3 * (reader.stride + 1))
+        band_rows = max(factor, rows_in_budget // factor * factor)
+        output: Optional[Image.Image] = None
+        y_out = 0
+
+        for band, box in reader.iter_bands(band_rows):
+            if band.mode == "P":
+                band = band.convert("RGBA" if "transparency" in band.info else "RGB")
+            elif band.mode in ("L", "RGB") and "transparency" in band.info:
+                band = band.convert("LA" if band.mode == "L" else "RGBA")
+            small = band.reduce(factor, box)
+            band.close()
+
+            if output is None:
+                output = Image.new(
+                    small.mode, (small.width, -(-reader.height // factor))
+                )
+            output.paste(small, (0, y_out))
+            y_out += small.height
+
+    return output
@@ -1,10 +1,42 @@
+from image_encoder import (
+    EncodeResult, EncodeStats, FORMAT_EXTENSIONS, PRESET_NAMES, available_formats, encode_image
+)
+from image_deduplicator import DHASH_SIZE, NearDuplicateIndex, dhash_image, image_dhash
+from image_directory_scanner import scan_image_files
+from png_strip_reader import PngStripReader, reduce_png_in_strips
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from typing import Callable, Iterator, Optional
 from PIL import Image
-import sys
+import argparse
+import hashlib
+import struct
+import json
+import time
 import os
 
 
+# Resampling presets: name -> reducing_gap passed to Image.resize.
+# None keeps the exact full-resolution LANCZOS; smaller gaps let Pillow
+# reduce() by an integer factor (and JPEG draft() decode at 1/2..1/8 scale)
+# before the final filter, trading exactness for speed and memory.
+RESAMPLE_PRESETS: dict[str, Optional[float]] = {
+    "exact": None,
+    "balanced": 3.0,
+    "fast": 2.0,
+}
+
+# PNGs above this many pixels are downscaled band by band
+DEFAULT_TILE_THRESHOLD_PIXELS: int = 64_000_000
+DEFAULT_MEMORY_BUDGET_BYTES: int = 256 * 1024 * 1024
+
+MANIFEST_FILENAME: str = ".conversion_manifest.json"
+HASH_BLOCK_SIZE: int = 1024 * 1024
+
+
 def img_scale_down_same_proportion(
-    image: Image.Image, target_width: int, target_height: int
+    image: Image.Image, target_width: int, target_height: int,
+    reducing_gap: Optional[float] = None,
 ) -> Image.Image:
 
     if (
@@ -27,22 +59,254 @@ def img_scale_down_same_proportion(
 
     new_width = min(new_width, target_width)
     new_height = min(new_height, target_height)
-    return image.resize((new_width, new_height), Image.LANCZOS)
+
+    if reducing_gap is None:
+        return image.resize((new_width, new_height), Image.LANCZOS)
+
+    if image.format == "JPEG" and new_width < width and new_height < height:
+        # Only effective before the pixel data is loaded: libjpeg decodes
+        # straight at the smallest DCT scale that still covers twice the
+        # target, leaving the final LANCZOS pass enough detail to work with.
+        image.draft("RGB", (new_width * 2, new_height * 2))
+
+    return image.resize((new_width, new_height), Image.LANCZOS, reducing_gap=reducing_gap)
+
+
+def reduce_large_png(
+    fpath: str,
+    target_width: int,
+    target_height: int,
+    reducing_gap: Optional[float] = None,
+    tile_threshold_pixels: int = DEFAULT_TILE_THRESHOLD_PIXELS,
+    memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+) -> Optional[Image.Image]:
+    """
+    Box-reduce a huge PNG in horizontal bands, so peak memory follows
+    memory_budget_bytes instead of the source size. The result is still
+    reducing_gap (3.0 for the exact preset) times the target, leaving the
+    final LANCZOS pass to img_scale_down_same_proportion. Returns None for
+    small, interlaced or non 8-bit PNGs, and for files that only carry a
+    .png name, which all take the regular path.
+    """
+    # The header is parsed here rather than with Image.open, which refuses
+    # the very sizes this path exists for (DecompressionBombError)
+    try:
+        with PngStripReader(fpath) as reader:
+            width, height = reader.width, reader.height
+            if width * height <= tile_threshold_pixels or not reader.supported:
+                return None
+    except (ValueError, struct.error):
+        return None
+
+    ratio = max(width / target_width, height / target_height)
+    factor = int(ratio / (reducing_gap or 3.0))
+    if factor < 2:
+        return None
+    return reduce_png_in_strips(fpath, factor, memory_budget_bytes)
+
+
+def convert_and_resize_image(
+    fpath: str,
+    new_fpath: str,
+    target_width: int,
+    target_height: int,
+    save_quality: Optional[int],
+    reducing_gap: Optional[float] = None,
+    output_format: str = "jpeg",
+    encoder_preset: str = "balanced",
+    tile_threshold_pixels: Optional[int] = DEFAULT_TILE_THRESHOLD_PIXELS,
+    memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+) -> EncodeResult:
+    reduced = None
+    if tile_threshold_pixels is not None and fpath.lower().endswith(".png"):
+        reduced = reduce_large_png(
+            fpath, target_width, target_height, reducing_gap,
+            tile_threshold_pixels, memory_budget_bytes,
+        )
+
+    with reduced if reduced is not None else Image.open(fpath) as img:
+        img_resized = img_scale_down_same_proportion(
+            img, target_width, target_height, reducing_gap
+        )
+        result = encode_image(
+            img_resized, output_format, encoder_preset, save_quality, new_fpath
+        )
+        img_resized.close()
+    return result
+
+
+def _convert_task(task: tuple) -> tuple[Optional[str], Optional[EncodeResult]]:
+    """Pool entry point, returns the error message instead of raising"""
+    try:
+        return None, convert_and_resize_image(*task)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", None
+
+
+def _dhash_task(task: tuple) -> Optional[int]:
+    """
+    Pool entry point for the dedup stage, None when the file is unreadable.
+    PNGs above the tile threshold are hashed from their strip-reduced image
+    so the memory budget holds here too.
+    """
+    fpath, cached_phash, tile_threshold_pixels, memory_budget_bytes = task[:4]
+    if cached_phash is not None:
+        return cached_phash
+    try:
+        reduced = None
+        if tile_threshold_pixels is not None and fpath.lower().endswith(".png"):
+            thumbnail_size = DHASH_SIZE * 8
+            reduced = reduce_large_png(
+                fpath, thumbnail_size, thumbnail_size, None,
+                tile_threshold_pixels, memory_budget_bytes,
+            )
+        if reduced is None:
+            return image_dhash(fpath)
+        with reduced:
+            return dhash_image(reduced)
+    except Exception:
+        return None
+
+
+def hash_file(fpath: str) -> str:
+    """Content hash for the manifest, xxhash when installed, blake2b otherwise"""
+    try:
+        import xxhash
+        hasher = xxhash.xxh3_128()
+    except ImportError:
+        hasher = hashlib.blake2b(digest_size=16)
+
+    with open(fpath, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def load_manifest(result_path: str) -> dict:
+    manifest_path = os.path.join(result_path, MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(result_path: str, manifest: dict) -> None:
+    manifest_path = os.path.join(result_path, MANIFEST_FILENAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def source_fingerprint(fpath: str, with_hash: bool = False) -> dict:
+    stat = os.stat(fpath)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if with_hash:
+        fingerprint["hash"] = hash_file(fpath)
+    return fingerprint
+
+
+def is_up_to_date(
+    entry: Optional[dict], fpath: str, new_fpath: str, settings: list, with_hash: bool
+) -> bool:
+    """
+    Check a manifest entry against the source. size + mtime is the fast
+    path; with_hash additionally lets touched-but-identical files through.
+    """
+    if not entry or entry.get("settings") != settings or not os.path.exists(new_fpath):
+        return False
+
+    stat = os.stat(fpath)
+    if entry.get("size") != stat.st_size:
+        return False
+    if entry.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+
+    if with_hash and entry.get("hash") and entry["hash"] == hash_file(fpath):
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+    return False
+
+
+def _run_tasks_in_order(
+    executor: Optional[ProcessPoolExecutor],
+    tasks: Iterator[tuple[str, tuple]],
+    window: int,
+    function: Callable[[tuple], object] = _convert_task,
+) -> Iterator[tuple[str, tuple, object]]:
+    """
+    Yield (key, task, function(task)) in submission order while keeping at
+    most window tasks in flight, so the task source is consumed lazily.
+    """
+    if executor is None:
+        for key, task in tasks:
+            yield key, task, function(task)
+        return
+
+    in_flight: deque = deque()
+    for key, task in tasks:
+        in_flight.append((key, task, executor.submit(function, task)))
+        if len(in_flight) >= window:
+            key, task, future = in_flight.popleft()
+            yield key, task, future.result()
+
+    while in_flight:
+        key, task, future = in_flight.popleft()
+        yield key, task, future.result()
 
 
 def convert_and_resize_images(
     dirpath: str,
     target_width: int = 1960,
     target_height: int = 1507,
-    save_quality: int = 100,
+    save_quality: Optional[int] = None,
     target_dirpath: str = "result",
-) -> None:
+    workers: int = 1,
+    resample_preset: str = "exact",
+    incremental: bool = False,
+    with_hash: bool = False,
+    recursive: bool = False,
+    output_format: str = "jpeg",
+    encoder_preset: str = "balanced",
+    dedup_threshold: Optional[int] = None,
+    dedup_report_path: Optional[str] = None,
+    tile_threshold_pixels: Optional[int] = DEFAULT_TILE_THRESHOLD_PIXELS,
+    memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+) -> list[tuple[str, str]]:
+    """
+    Convert every PNG/JPG in dirpath into target_dirpath. With recursive
+    set, subdirectories are walked too and mirrored under target_dirpath.
+    With workers > 1 the files are fanned out over a process pool; results
+    are still reported in directory order. Returns the (relative path,
+    error) pairs of the files that failed, the rest of the batch keeps going.
+
+    output_format and encoder_preset select the image_encoder preset,
+    save_quality (when given) overrides the preset's quality.
+
+    With incremental set, a manifest in target_dirpath records each source
+    fingerprint and the conversion settings, and unchanged files are skipped.
+
+    With dedup_threshold set, every source gets a 64-bit dHash and only the
+    first image of each near-duplicate group (Hamming distance within the
+    threshold) is converted; the groups are written to dedup_report_path
+    (default: dedup_report.json in target_dirpath).
+
+    PNGs above tile_threshold_pixels are decoded and reduced in bands
+    bounded by memory_budget_bytes; None disables the tiled path.
+    """
 
     if (
         not isinstance(dirpath, str)
         or not os.path.isdir(dirpath)
         or not isinstance(target_height, int)
         or not isinstance(target_width, int)
+        or not isinstance(workers, int)
+        or workers < 1
+        or resample_preset not in RESAMPLE_PRESETS
+        or output_format not in available_formats()
+        or encoder_preset not in PRESET_NAMES
     ):
         raise ValueError("\033[31mParameters are invalid\033[0m")
 
@@ -51,36 +315,183 @@ def convert_and_resize_images(
     if not os.path.exists(result_path):
         os.mkdir(result_path)
 
-    for fname in os.listdir(dirpath):
-        lower_fname = fname.lower()
-        if lower_fname.endswith(".png") or lower_fname.endswith(".jpg"):
-            fpath = os.path.join(dirpath, fname)
-            img = Image.open(fpath)
+    settings = [
+        target_width, target_height, save_quality, resample_preset,
+        output_format, encoder_preset,
+    ]
+    output_ext = FORMAT_EXTENSIONS[output_format]
+    stats = EncodeStats()
+    manifest: dict = load_manifest(result_path) if incremental else {}
+
+    created_dirs: set[str] = {result_path}
+    counters: dict[str, int] = {"skipped": 0, "total": 0, "duplicates": 0}
+    dedup_index = NearDuplicateIndex(dedup_threshold) if dedup_threshold is not None else None
+    phashes: dict[str, int] = {}
 
-            img_resized = img_scale_down_same_proportion(
-                img, target_width, target_height
+    def iter_sources() -> Iterator[tuple[str, tuple]]:
+        for fpath, rel_path in scan_image_files(
+            dirpath, (".png", ".jpg"), recursive, exclude_dirpaths=[result_path]
+        ):
+            new_fpath = os.path.join(result_path, os.path.splitext(rel_path)[0] + output_ext)
+
+            entry = manifest.get(rel_path)
+            up_to_date = incremental and is_up_to_date(
+                entry, fpath, new_fpath, settings, with_hash
+            )
+            cached_phash = entry.get("phash") if up_to_date else None
+            yield rel_path, (
+                fpath, cached_phash, tile_threshold_pixels, memory_budget_bytes, new_fpath, up_to_date
             )
 
-            new_fname = os.path.splitext(fname)[0] + ".jpg"
-            new_fpath = os.path.join(result_path, new_fname)
+    def iter_hashed_sources() -> Iterator[tuple[str, tuple, Optional[int]]]:
+        if dedup_index is None:
+            for rel_path, source in iter_sources():
+                yield rel_path, source, None
+            return
+        # Hashes run on the pool a bounded window ahead of the conversions
+        # and come back in directory order, so the same image of each group
+        # is kept whatever the worker count
+        yield from _run_tasks_in_order(executor, iter_sources(), workers * 4, _dhash_task)
 
-            img_resized.convert("RGB").save(new_fpath, "JPEG", quality=save_quality)
+    def iter_tasks() -> Iterator[tuple[str, tuple]]:
+        for rel_path, source, phash in iter_hashed_sources():
+            fpath, _, _, _, new_fpath, up_to_date = source
 
-            img.close()
-            img_resized.close()
-            print(f"Converted and resized {fname} to {new_fname}")
+            if dedup_index is not None:
+                # phash is None for unreadable files, let the conversion report them
+                if phash is not None:
+                    if dedup_index.find_or_add(phash, rel_path) is not None:
+                        counters["duplicates"] += 1
+                        continue
+                    phashes[rel_path] = phash
+
+            if up_to_date:
+                counters["skipped"] += 1
+                continue
+
+            new_dirpath = os.path.dirname(new_fpath)
+            if new_dirpath not in created_dirs:
+                os.makedirs(new_dirpath, exist_ok=True)
+                created_dirs.add(new_dirpath)
+
+            counters["total"] += 1
+            yield rel_path, (
+                fpath,
+                new_fpath,
+                target_width,
+                target_height,
+                save_quality,
+                RESAMPLE_PRESETS[resample_preset],
+                output_format,
+                encoder_preset,
+                tile_threshold_pixels,
+                memory_budget_bytes,
+            )
+
+    start_time = time.perf_counter()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    errors: list[tuple[str, str]] = []
+    try:
+        for rel_path, task, (error, result) in _run_tasks_in_order(
+            executor, iter_tasks(), workers * 4
+        ):
+            if error is None:
+                stats.add(output_format, os.path.getsize(task[0]), result)
+                print(f"Converted and resized {rel_path} to {os.path.relpath(task[1], result_path)}")
+                if incremental:
+                    manifest[rel_path] = {
+                        **source_fingerprint(task[0], with_hash), "settings": settings
+                    }
+                    if rel_path in phashes:
+                        manifest[rel_path]["phash"] = phashes[rel_path]
+            else:
+                errors.append((rel_path, error))
+                manifest.pop(rel_path, None)
+                print(f"\033[31mFailed to convert {rel_path}: {error}\033[0m")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if incremental:
+            save_manifest(result_path, manifest)
+        if dedup_index is not None:
+            dedup_index.save_report(
+                dedup_report_path or os.path.join(result_path, "dedup_report.json")
+            )
+
+    elapsed = time.perf_counter() - start_time
+    converted = counters["total"] - len(errors)
+    rate = converted / elapsed if elapsed > 0 else 0.0
+    print(
+        f"{converted}/{counters['total']} images converted in {elapsed:.2f}s "
+        f"({rate:.1f} images/s, {workers} worker(s))"
+        + (f", {counters['skipped']} unchanged skipped" if incremental else "")
+        + (f", {counters['duplicates']} near-duplicates skipped" if dedup_index else "")
+    )
+    stats.report()
+    return errors
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Resize PNG/JPG images and save them as JPEG/WebP/AVIF")
+    parser.add_argument("mode", choices=["cover", "show"],
+                        help="cover: 1280x960, show: 1960x1507")
+    parser.add_argument("dirpath", help="Directory containing the source images")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Number of worker processes (default: 1)")
+    parser.add_argument("-r", "--resample", choices=list(RESAMPLE_PRESETS), default="balanced",
+                        help="Downscale quality/speed trade-off (default: balanced)")
+    parser.add_argument("-f", "--format", choices=available_formats(), default="jpeg",
+                        help="Output format (default: jpeg)")
+    parser.add_argument("-p", "--preset", choices=PRESET_NAMES, default="balanced",
+                        help="Encoder speed/size preset (default: balanced)")
+    parser.add_argument("-q", "--quality", type=int, default=None,
+                        help="Override the preset's encoder quality")
+    parser.add_argument("-R", "--recursive", action="store_true",
+                        help="Also convert images in subdirectories, mirroring the tree")
+    parser.add_argument("--dedup", type=int, default=None, metavar="THRESHOLD",
+                        help="Skip near-duplicates within THRESHOLD bits of dHash distance")
+    parser.add_argument("--dedup-report", default=None,
+                        help="Path of the JSON duplicate report (default: <result>/dedup_report.json)")
+    parser.add_argument("--tile-threshold-mp", type=float,
+                        default=DEFAULT_TILE_THRESHOLD_PIXELS / 1e6,
+                        help="Downscale PNGs above this many megapixels in bands (default: 64)")
+    parser.add_argument("--memory-budget-mb", type=int,
+                        default=DEFAULT_MEMORY_BUDGET_BYTES // (1024 * 1024),
+                        help="Memory budget for banded PNG decoding (default: 256)")
+    parser.add_argument("--force", action="store_true",
+                        help="Reconvert everything, ignoring the manifest in the result directory")
+    parser.add_argument("--hash", action="store_true",
+                        help="Also fingerprint sources by content hash (xxhash/blake2b)")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    mode = sys.argv[1]
-    dirpath = sys.argv[2]
+    args = parse_arguments()
 
-    if (mode == "cover"):
-        convert_and_resize_images(dirpath, 1280, 960)
-    elif (mode == "show"):
-        convert_and_resize_images(dirpath)
+    if (args.mode == "cover"):
+        errors = convert_and_resize_images(
+            args.dirpath, 1280, 960,
+            workers=args.workers, resample_preset=args.resample,
+            incremental=not args.force, with_hash=args.hash,
+            recursive=args.recursive, output_format=args.format,
+            encoder_preset=args.preset, save_quality=args.quality,
+            dedup_threshold=args.dedup, dedup_report_path=args.dedup_report,
+            tile_threshold_pixels=int(args.tile_threshold_mp * 1e6),
+            memory_budget_bytes=args.memory_budget_mb * 1024 * 1024
+        )
     else:
-        print("No valid option was specified")
+        errors = convert_and_resize_images(
+            args.dirpath, workers=args.workers, resample_preset=args.resample,
+            incremental=not args.force, with_hash=args.hash,
+            recursive=args.recursive, output_format=args.format,
+            encoder_preset=args.preset, save_quality=args.quality,
+            dedup_threshold=args.dedup, dedup_report_path=args.dedup_report,
+            tile_threshold_pixels=int(args.tile_threshold_mp * 1e6),
+            memory_budget_bytes=args.memory_budget_mb * 1024 * 1024
+        )
+
+    if errors:
+        print(f"{len(errors)} file(s) failed")
         exit(1)
     print("Complete!")
-        
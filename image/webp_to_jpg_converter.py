@@ -1,32 +1,213 @@
+from image_encoder import (
+    EncodeStats, FORMAT_EXTENSIONS, PRESET_NAMES, available_formats, encode_image
+)
+from image_directory_scanner import scan_image_files
 from PIL import Image
+import threading
+import argparse
+import queue
+import time
+import io
 import os
 
-def convert_webp_to_jpg(input_folder, output_folder):
+
+class ByteBudget:
+    """
+    Counting semaphore over bytes. acquire blocks while the pending bytes
+    would exceed the limit; a single item larger than the whole budget is
+    still let through once nothing else is pending, so it cannot deadlock.
     """
-    Convert all WebP images in the input folder to JPG and save them in the output folder.
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size):
+        with self._condition:
+            while self.in_use > 0 and self.in_use + size > self.limit:
+                self._condition.wait()
+            self.in_use += size
+
+    def release(self, size):
+        with self._condition:
+            self.in_use -= size
+            self._condition.notify_all()
+
+
+_STOP = object()
+
+
+def _read_worker(path_queue, decode_queue, budget):
+    while (item := path_queue.get()) is not _STOP:
+        webp_path, jpg_path = item
+        try:
+            size = os.path.getsize(webp_path)
+            budget.acquire(size)
+            try:
+                with open(webp_path, 'rb') as f:
+                    data = f.read()
+            except Exception:
+                budget.release(size)
+                raise
+            decode_queue.put((webp_path, jpg_path, size, data, None))
+        except Exception as e:
+            decode_queue.put((webp_path, jpg_path, 0, None, e))
+
+
+def _encode_worker(decode_queue, write_queue, output_format, preset, quality):
+    while (item := decode_queue.get()) is not _STOP:
+        webp_path, jpg_path, size, data, error = item
+        encoded = result = None
+        if error is None:
+            try:
+                # Pillow drops the GIL inside the codec calls, so these
+                # threads decode and encode in parallel
+                with Image.open(io.BytesIO(data)) as img:
+                    output = io.BytesIO()
+                    result = encode_image(img, output_format, preset, quality, output)
+                    encoded = output.getvalue()
+            except Exception as e:
+                error = e
+        del data
+        write_queue.put((webp_path, jpg_path, size, encoded, result, error))
+
+
+def _write_worker(write_queue, budget, stats, encode_stats, output_format):
+    created_folders = set()
+    while (item := write_queue.get()) is not _STOP:
+        webp_path, jpg_path, size, encoded, result, error = item
+        try:
+            if error is not None:
+                raise error
+            jpg_folder = os.path.dirname(jpg_path)
+            if jpg_folder not in created_folders:
+                os.makedirs(jpg_folder, exist_ok=True)
+                created_folders.add(jpg_folder)
+            with open(jpg_path, 'wb') as f:
+                f.write(encoded)
+            stats['converted'] += 1
+            encode_stats.add(output_format, size, result)
+            print(f"Converted: {webp_path} -> {jpg_path}")
+        except Exception as e:
+            stats['failed'] += 1
+            print(f"Failed to convert {webp_path}: {e}")
+        finally:
+            budget.release(size)
+
+
+def convert_webp_to_jpg(
+    input_folder, output_folder, recursive=False, readers=2, encoders=None,
+    max_buffer_bytes=256 * 1024 * 1024, quality=None,
+    output_format='jpeg', preset='balanced',
+):
+    """
+    Convert all WebP images in the input folder to JPG (or another
+    image_encoder format) and save them in the output folder.
+
+    Files flow through a bounded pipeline: reader threads load the raw
+    bytes, encoder threads decode and re-encode them, and a single writer
+    thread flushes the results. Raw bytes in flight are capped by
+    max_buffer_bytes, and every queue is bounded, so memory stays flat
+    even on folders of very large animated WebPs.
 
     :param input_folder: Path to the folder containing WebP images.
     :param output_folder: Path to the folder where converted JPG images will be saved.
+    :param recursive: Also convert subfolders, mirroring the tree in the output folder.
+    :param readers: Number of reader threads.
+    :param encoders: Number of decode/encode threads, defaults to the CPU count.
+    :param max_buffer_bytes: Upper bound for source bytes held in memory at once.
+    :param quality: Encoder quality, overrides the preset's quality.
+    :param output_format: Output format, one of image_encoder.available_formats().
+    :param preset: Encoder speed/size preset.
+    :return: Tuple of (converted, failed) counts.
     """
+    encoders = encoders or os.cpu_count() or 1
+    if output_format not in available_formats():
+        raise ValueError(f"Output format '{output_format}' is not available")
+    if preset not in PRESET_NAMES:
+        raise ValueError(f"Unknown preset '{preset}'")
+    output_ext = FORMAT_EXTENSIONS[output_format]
+
     # Create output folder if it doesn't exist
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    for filename in os.listdir(input_folder):
-        if filename.lower().endswith('.webp'):
-            webp_path = os.path.join(input_folder, filename)
-            jpg_path = os.path.join(output_folder, os.path.splitext(filename)[0] + '.jpg')
-            
-            try:
-                with Image.open(webp_path) as img:
-                    rgb_img = img.convert('RGB')  # Convert image to RGB format
-                    rgb_img.save(jpg_path, 'JPEG')  # Save as JPG
-                    print(f"Converted: {webp_path} -> {jpg_path}")
-            except Exception as e:
-                print(f"Failed to convert {webp_path}: {e}")
+    budget = ByteBudget(max_buffer_bytes)
+    stats = {'converted': 0, 'failed': 0}
+    encode_stats = EncodeStats()
+    path_queue = queue.Queue(maxsize=readers * 4)
+    decode_queue = queue.Queue(maxsize=encoders * 2)
+    write_queue = queue.Queue(maxsize=encoders * 2)
+
+    reader_threads = [
+        threading.Thread(target=_read_worker, args=(path_queue, decode_queue, budget), daemon=True)
+        for _ in range(readers)
+    ]
+    encoder_threads = [
+        threading.Thread(target=_encode_worker, args=(decode_queue, write_queue, output_format, preset, quality), daemon=True)
+        for _ in range(encoders)
+    ]
+    writer_thread = threading.Thread(
+        target=_write_worker, args=(write_queue, budget, stats, encode_stats, output_format), daemon=True
+    )
+    for thread in reader_threads + encoder_threads + [writer_thread]:
+        thread.start()
+
+    for webp_path, rel_path in scan_image_files(
+        input_folder, ('.webp',), recursive, exclude_dirpaths=[output_folder]
+    ):
+        jpg_path = os.path.join(output_folder, os.path.splitext(rel_path)[0] + output_ext)
+        path_queue.put((webp_path, jpg_path))
+
+    # Shut the stages down in order, each one drains before the next stops
+    for stage_queue, threads in (
+        (path_queue, reader_threads), (decode_queue, encoder_threads), (write_queue, [writer_thread])
+    ):
+        for _ in threads:
+            stage_queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+    encode_stats.report()
+    return stats['converted'], stats['failed']
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Convert WebP images to JPG, WebP or AVIF")
+    parser.add_argument("input_folder", help="Folder containing WebP images")
+    parser.add_argument("-o", "--output", default="./output_jpg",
+                        help="Output folder (default: ./output_jpg)")
+    parser.add_argument("-R", "--recursive", action="store_true",
+                        help="Also convert subfolders, mirroring the tree")
+    parser.add_argument("-j", "--encoders", type=int, default=None,
+                        help="Decode/encode threads (default: CPU count)")
+    parser.add_argument("--readers", type=int, default=2, help="Reader threads (default: 2)")
+    parser.add_argument("--max-buffer-mb", type=int, default=256,
+                        help="Max source megabytes held in memory (default: 256)")
+    parser.add_argument("-f", "--format", choices=available_formats(), default="jpeg",
+                        help="Output format (default: jpeg)")
+    parser.add_argument("-p", "--preset", choices=PRESET_NAMES, default="balanced",
+                        help="Encoder speed/size preset (default: balanced)")
+    parser.add_argument("-q", "--quality", type=int, default=None,
+                        help="Override the preset's encoder quality")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_folder):
+        parser.error(f"Input folder '{args.input_folder}' does not exist")
+    if args.readers < 1 or (args.encoders is not None and args.encoders < 1) or args.max_buffer_mb < 1:
+        parser.error("--readers, --encoders and --max-buffer-mb must be positive")
+    return args
+
 
 if __name__ == "__main__":
-    input_folder = r"D:\Downloads\Emojs"
-    output_folder = "./output_jpg"  # Replace with your output folder path
+    args = parse_arguments()
 
-    convert_webp_to_jpg(input_folder, output_folder)
+    start_time = time.perf_counter()
+    converted, failed = convert_webp_to_jpg(
+        args.input_folder, args.output, args.recursive, args.readers,
+        args.encoders, args.max_buffer_mb * 1024 * 1024, args.quality,
+        args.format, args.preset,
+    )
+    elapsed = time.perf_counter() - start_time
+    print(f"{converted} converted, {failed} failed in {elapsed:.2f}s")
@@ -0,0 +1,239 @@
+from ip_address_transformer import _pack_ipv4, ips_to_ints
+from array import array
+from bisect import bisect_right
+from typing import Iterable, Optional
+import argparse
+import struct
+import mmap
+import sys
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+INDEX_FILE_MAGIC: bytes = b"CIDRIDX1"
+INDEX_HEADER_FORMAT: str = "<8sII"
+NO_MATCH: int = 0xFFFFFFFF
+
+
+def parse_ipv4(ip: str) -> int:
+    """Dotted-quad to uint32 via inet_pton, so out-of-range octets raise ValueError"""
+    try:
+        return int.from_bytes(_pack_ipv4(ip), 'big')
+    except (OSError, TypeError):
+        raise ValueError(f"Invalid IPv4 address: {ip!r}") from None
+
+
+def parse_cidr(prefix: str) -> tuple[int, int]:
+    """Parse 'a.b.c.d/len' (or a bare address) into an inclusive (start, end) pair"""
+    address, _, length = prefix.strip().partition('/')
+    prefix_len = int(length) if length else 32
+    if not 0 <= prefix_len <= 32:
+        raise ValueError(f"Invalid prefix length in {prefix!r}")
+
+    host_mask = (1 << (32 - prefix_len)) - 1
+    start = parse_ipv4(address) & ~host_mask & 0xFFFFFFFF
+    return start, start | host_mask
+
+
+class CidrRangeIndex:
+    """
+    Longest-prefix lookup table for IPv4 prefixes.
+
+    Nested and overlapping prefixes are flattened into sorted, disjoint
+    [start, end] segments, each owned by the most specific prefix covering
+    it, so a lookup is a single binary search.
+    """
+
+    def __init__(self, prefixes: Iterable[str] = ()):
+        self.prefixes: list[str] = []
+        self.starts = array('I')
+        self.ends = array('I')
+        self.owners = array('I')
+        self._mmap: Optional[mmap.mmap] = None
+
+        prefixes = list(prefixes)
+        if prefixes:
+            self.build(prefixes)
+
+    def build(self, prefixes: list[str]) -> None:
+        self.prefixes = [p.strip() for p in prefixes]
+        # Broader prefixes must come before narrower ones sharing a start
+        ranges = sorted(
+            ((*parse_cidr(p), idx) for idx, p in enumerate(self.prefixes)),
+            key=lambda r: (r[0], -r[1], r[2])
+        )
+
+        starts, ends, owners = array('I'), array('I'), array('I')
+
+        def emit(start: int, end: int, owner: int) -> None:
+            if start > end:
+                return
+            if owners and owners[-1] == owner and ends[-1] + 1 == start:
+                ends[-1] = end
+                return
+            starts.append(start)
+            ends.append(end)
+            owners.append(owner)
+
+        stack: list[tuple[int, int, int]] = []
+        cursor = 0
+        for start, end, owner in ranges:
+            while stack and stack[-1][1] < start:
+                _, top_end, top_owner = stack.pop()
+                emit(cursor, top_end, top_owner)
+                cursor = top_end + 1
+            if stack and stack[-1][0] == start and stack[-1][1] == end:
+                continue  # duplicate prefix, first one wins
+            if stack:
+                emit(cursor, start - 1, stack[-1][2])
+            stack.append((start, end, owner))
+            cursor = start
+
+        while stack:
+            _, top_end, top_owner = stack.pop()
+            emit(cursor, top_end, top_owner)
+            cursor = top_end + 1
+
+        self.starts, self.ends, self.owners = starts, ends, owners
+
+    @classmethod
+    def from_prefix_file(cls, file_path: str) -> "CidrRangeIndex":
+        """Build an index from a text file with one prefix per line ('#' comments allowed)"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            prefixes = [
+                line.split('#', 1)[0].strip() for line in f
+            ]
+        return cls(p for p in prefixes if p)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def lookup_int(self, ip_int: int) -> Optional[str]:
+        pos = bisect_right(self.starts, ip_int) - 1
+        if pos >= 0 and ip_int <= self.ends[pos]:
+            return self.prefixes[self.owners[pos]]
+        return None
+
+    def lookup(self, ip: str) -> Optional[str]:
+        """Return the most specific prefix containing ip, or None"""
+        return self.lookup_int(parse_ipv4(ip))
+
+    def __contains__(self, ip: str) -> bool:
+        return self.lookup(ip) is not None
+
+    def lookup_owners(self, ip_ints):
+        """
+        Batch lookup over a uint32 array. Returns an array of prefix
+        indices (into self.prefixes), NO_MATCH where nothing matched.
+        """
+        if np is not None:
+            values = np.asarray(ip_ints, dtype=np.uint32)
+            result = np.full(len(values), NO_MATCH, dtype=np.uint32)
+            if not len(self.starts):
+                return result
+
+            starts = np.frombuffer(self.starts, dtype=np.uint32)
+            ends = np.frombuffer(self.ends, dtype=np.uint32)
+            owners = np.frombuffer(self.owners, dtype=np.uint32)
+            pos = np.searchsorted(starts, values, side='right') - 1
+            safe_pos = np.clip(pos, 0, None)
+            hit = (pos >= 0) & (values <= ends[safe_pos])
+            result[hit] = owners[safe_pos[hit]]
+            return result
+
+        starts, ends, owners = self.starts, self.ends, self.owners
+        result = array('I')
+        for value in ip_ints:
+            pos = bisect_right(starts, value) - 1
+            result.append(owners[pos] if pos >= 0 and value <= ends[pos] else NO_MATCH)
+        return result
+
+    def lookup_many(self, ips: Iterable[str]) -> list[Optional[str]]:
+        """Batch version of lookup for dotted-quad strings"""
+        prefixes = self.prefixes
+        return [
+            None if owner == NO_MATCH else prefixes[owner]
+            for owner in self.lookup_owners(ips_to_ints(ips))
+        ]
+
+    def save(self, file_path: str) -> None:
+        """Write the compiled index in a layout that load() can memory-map"""
+        labels = "\n".join(self.prefixes).encode('utf-8')
+        columns = [array('I', column) for column in (self.starts, self.ends, self.owners)]
+        if sys.byteorder == 'big':
+            for column in columns:
+                column.byteswap()
+
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(struct.pack(INDEX_HEADER_FORMAT, INDEX_FILE_MAGIC, len(self.starts), len(labels)))
+            for column in columns:
+                f.write(column.tobytes())
+            f.write(labels)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> "CidrRangeIndex":
+        """Memory-map an index written by save(); the segment columns are not copied"""
+        index = cls()
+        with open(file_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header_size = struct.calcsize(INDEX_HEADER_FORMAT)
+        magic, count, labels_size = struct.unpack_from(INDEX_HEADER_FORMAT, mapped)
+        if magic != INDEX_FILE_MAGIC:
+            mapped.close()
+            raise ValueError(f"{file_path} is not a CIDR index file")
+
+        view = memoryview(mapped)
+        column_size = count * 4
+        columns = []
+        for i in range(3):
+            offset = header_size + i * column_size
+            column = view[offset:offset + column_size].cast('I')
+            if sys.byteorder == 'big':
+                column = array('I', column)
+                column.byteswap()
+            columns.append(column)
+
+        labels_offset = header_size + 3 * column_size
+        labels = bytes(view[labels_offset:labels_offset + labels_size]).decode('utf-8')
+
+        index.starts, index.ends, index.owners = columns
+        index.prefixes = labels.split("\n") if labels else []
+        index._mmap = mapped
+        return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build and query an IPv4 CIDR range index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Compile a prefix list into an index file")
+    build_parser.add_argument("prefix_file", help="Text file with one CIDR prefix per line")
+    build_parser.add_argument("index_file", help="Output index file")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Look up addresses in a compiled index")
+    lookup_parser.add_argument("index_file", help="Index file written by 'build'")
+    lookup_parser.add_argument("ips", nargs="*", help="Addresses to look up (stdin if omitted)")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = CidrRangeIndex.from_prefix_file(args.prefix_file)
+        index.save(args.index_file)
+        print(f"Compiled {len(index.prefixes)} prefixes into {len(index)} segments: {args.index_file}")
+        return
+
+    index = CidrRangeIndex.load(args.index_file)
+    ips = args.ips or [line.strip() for line in sys.stdin if line.strip()]
+    for ip, prefix in zip(ips, index.lookup_many(ips)):
+        print(f"{ip}\t{prefix if prefix is not None else '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+from ip_address_transformer import (
+    ip_to_int, int_to_ip, ip_to_hex, ips_to_ints, ints_to_ips, ips_to_hex
+)
+import argparse
+import random
+import time
+
+
+def generate_ips(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        f"{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+        for _ in range(count)
+    ]
+
+
+def measure(label: str, func, count: int) -> float:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.3f}s  {count / elapsed / 1e6:8.2f} M addr/s")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare per-call and batch IPv4 conversion throughput")
+    parser.add_argument("-n", "--count", type=int, default=1_000_000, help="Number of addresses")
+    args = parser.parse_args()
+
+    ips = generate_ips(args.count)
+    ints = ips_to_ints(ips)
+
+    assert list(ints[:1000]) == [ip_to_int(ip) for ip in ips[:1000]]
+    assert ints_to_ips(ints[:1000]) == ips[:1000]
+
+    print(f"Benchmarking {args.count} addresses")
+    print("-" * 60)
+    per_call = measure("ip_to_int (per call)", lambda: [ip_to_int(ip) for ip in ips], args.count)
+    batch = measure("ips_to_ints (batch)", lambda: ips_to_ints(ips), args.count)
+    print(f"{'speedup':<28} {per_call / batch:8.2f}x")
+    print("-" * 60)
+    per_call = measure("int_to_ip (per call)", lambda: [int_to_ip(i) for i in ints], args.count)
+    batch = measure("ints_to_ips (batch)", lambda: ints_to_ips(ints), args.count)
+    print(f"{'speedup':<28} {per_call / batch:8.2f}x")
+    print("-" * 60)
+    per_call = measure("ip_to_hex (per call)", lambda: [ip_to_hex(ip) for ip in ips], args.count)
+    batch = measure("ips_to_hex (batch)", lambda: ips_to_hex(ips), args.count)
+    print(f"{'speedup':<28} {per_call / batch:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,31 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from array import array
+from typing import BinaryIO, Callable, Iterable
+import argparse
+import tempfile
+import shutil
+import socket
+import sys
+import os
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
 def ip_to_int(ip: str) -> int:
     parts = ip.split('.')
+    if len(parts) != 4:
+        raise ValueError(f"Invalid IPv4 address: {ip!r}, use ipv6_to_int for IPv6")
     return (int(parts[0]) << 24) + (int(parts[1]) << 16) + (int(parts[2]) << 8) + int(parts[3])
 
 
 def int_to_ip(ip_int) -> str:
+    if not 0 <= ip_int <= 0xFFFFFFFF:
+        raise ValueError(f"{ip_int} is out of the IPv4 range, use int_to_ipv6 instead")
     return '.'.join(str((ip_int >> i) & 0xFF) for i in [24, 16, 8, 0])
 
 
@@ -12,11 +34,432 @@ def ip_to_hex(ip) -> str:
     return hex_ip
 
 
-if __name__ == "__main__":
-    ip = '127.0.0.1'
-    ip_hex = ip_to_int(ip)
-    print(ip_hex)
+def _new_uint32_array() -> array:
+    # 'I' is 4 bytes on every platform we run on, but the C standard only
+    # guarantees 2, so fall back to 'L' where needed.
+    return array('I') if array('I').itemsize == 4 else array('L')
+
+
+def _as_list(ips: Iterable[str]) -> list:
+    """Materialise the input once so a failed batch can be searched for the culprit"""
+    if np is not None and isinstance(ips, np.ndarray):
+        return ips.tolist()
+    return ips if isinstance(ips, (list, tuple)) else list(ips)
+
+
+def _raise_invalid_address(ips: list, pack: Callable[[str], bytes], family: str) -> None:
+    for ip in ips:
+        try:
+            pack(ip)
+        except (OSError, TypeError, ValueError):
+            raise ValueError(f"Invalid {family} address: {ip!r}") from None
+
+
+def _pack_ipv4(ip: str) -> bytes:
+    return socket.inet_pton(socket.AF_INET, ip)
+
+
+def _pack_ips(ips: Iterable[str]) -> bytes:
+    """
+    Pack dotted-quad strings into one big-endian uint32 byte buffer.
+    Raises ValueError naming the first malformed address.
+    """
+    ips = _as_list(ips)
+    inet_pton = socket.inet_pton
+    af_inet = socket.AF_INET
+    try:
+        return b''.join([inet_pton(af_inet, ip) for ip in ips])
+    except (OSError, TypeError):
+        _raise_invalid_address(ips, _pack_ipv4, "IPv4")
+        raise
+
+
+def _unpack_ints(ip_ints) -> bytes:
+    """Turn a uint32 array/iterable into one big-endian byte buffer"""
+    if np is not None and isinstance(ip_ints, np.ndarray):
+        return ip_ints.astype('>u4', copy=False).tobytes()
+
+    if not isinstance(ip_ints, array):
+        packed = _new_uint32_array()
+        packed.extend(ip_ints)
+        ip_ints = packed
+    else:
+        ip_ints = array(ip_ints.typecode, ip_ints)
+
+    if sys.byteorder == 'little':
+        ip_ints.byteswap()
+    return ip_ints.tobytes()
+
+
+def ips_to_ints(ips: Iterable[str], use_numpy: bool = False):
+    """
+    Convert many dotted-quad addresses to uint32 in one pass.
+    Returns array('I') by default, or a numpy uint32 array when
+    use_numpy is set (or the input itself is a numpy array).
+    Raises ValueError naming the first malformed address.
+    """
+    as_numpy = np is not None and (use_numpy or isinstance(ips, np.ndarray))
+    packed = _pack_ips(ips)
+
+    if as_numpy:
+        return np.frombuffer(packed, dtype='>u4').astype(np.uint32)
+
+    result = _new_uint32_array()
+    result.frombytes(packed)
+    if sys.byteorder == 'little':
+        result.byteswap()
+    return result
+
+
+def ints_to_ips(ip_ints) -> list[str]:
+    """Convert an array('I'), numpy uint32 array or iterable of ints to dotted-quad strings"""
+    packed = _unpack_ints(ip_ints)
+    view = memoryview(packed)
+    inet_ntoa = socket.inet_ntoa
+    return [inet_ntoa(view[i:i + 4]) for i in range(0, len(packed), 4)]
+
+
+def ips_to_hex(ips: Iterable[str]) -> list[str]:
+    """
+    Convert many dotted-quad addresses to the '0x7f000001' form of ip_to_hex.
+    Raises ValueError naming the first malformed address.
+    """
+    packed = _pack_ips(ips)
+    hex_str = packed.hex()
+    return ['0x' + hex_str[i:i + 8] for i in range(0, len(hex_str), 8)]
+
+
+IPV4_MAPPED_PREFIX: bytes = b"\x00" * 10 + b"\xff\xff"
+
+
+def _pack_ipv6(ip: str) -> bytes:
+    try:
+        return socket.inet_pton(socket.AF_INET6, ip)
+    except OSError:
+        raise ValueError(f"Invalid IPv6 address: {ip!r}") from None
+
+
+def ipv6_to_int(ip: str) -> int:
+    """Convert an IPv6 address ('::' compression and '::ffff:a.b.c.d' allowed) to a 128-bit int"""
+    return int.from_bytes(_pack_ipv6(ip), "big")
+
+
+def int_to_ipv6(ip_int: int) -> str:
+    """Convert a 128-bit int to the canonical compressed IPv6 form"""
+    if not 0 <= ip_int < 1 << 128:
+        raise ValueError(f"{ip_int} is out of the IPv6 range")
+    return socket.inet_ntop(socket.AF_INET6, ip_int.to_bytes(16, "big"))
+
+
+def ipv6_to_hex(ip: str) -> str:
+    return "0x" + _pack_ipv6(ip).hex()
+
+
+def ip_version(ip: str) -> int:
+    return 6 if ":" in ip else 4
+
+
+def any_ip_to_int(ip: str) -> int:
+    """
+    Mixed-family conversion into one 128-bit space: IPv4 addresses are
+    mapped to ::ffff:a.b.c.d so both families can share a column.
+    """
+    if ip_version(ip) == 6:
+        return ipv6_to_int(ip)
+    return (0xFFFF << 32) | ip_to_int(ip)
+
+
+def int_to_any_ip(ip_int: int) -> str:
+    """Inverse of any_ip_to_int, IPv4-mapped values come back as dotted quads"""
+    if ip_int >> 32 == 0xFFFF:
+        return int_to_ip(ip_int & 0xFFFFFFFF)
+    return int_to_ipv6(ip_int)
+
+
+def _pack_any_ip(ip: str) -> bytes:
+    if ":" in ip:
+        return socket.inet_pton(socket.AF_INET6, ip)
+    return IPV4_MAPPED_PREFIX + socket.inet_pton(socket.AF_INET, ip)
 
-    ip_int = 2130706433
-    ip = int_to_ip(ip_int)
-    print(ip)
+
+def _pack_any_ips(ips: Iterable[str]) -> bytes:
+    ips = _as_list(ips)
+    try:
+        return b"".join([_pack_any_ip(ip) for ip in ips])
+    except (OSError, TypeError):
+        _raise_invalid_address(ips, _pack_any_ip, "IP")
+        raise
+
+
+def ips_to_u64_columns(ips: Iterable[str], use_numpy: bool = False):
+    """
+    Convert many IPv4/IPv6 addresses to two uint64 columns (high and low
+    64 bits of the any_ip_to_int value). Returns (array('Q'), array('Q'))
+    or a pair of numpy uint64 arrays. Raises ValueError naming the first
+    malformed address.
+    """
+    if np is not None and isinstance(ips, np.ndarray):
+        use_numpy = True
+    packed = _pack_any_ips(ips)
+
+    if np is not None and use_numpy:
+        words = np.frombuffer(packed, dtype=">u8").reshape(-1, 2)
+        return words[:, 0].astype(np.uint64), words[:, 1].astype(np.uint64)
+
+    words = array("Q")
+    words.frombytes(packed)
+    if sys.byteorder == "little":
+        words.byteswap()
+    return words[0::2], words[1::2]
+
+
+def u64_columns_to_ips(high, low) -> list[str]:
+    """Inverse of ips_to_u64_columns, IPv4-mapped rows come back as dotted quads"""
+    if np is not None and isinstance(high, np.ndarray):
+        packed = np.stack([high, low], axis=1).astype(">u8").tobytes()
+    else:
+        words = array("Q", bytes(16 * len(high)))
+        words[0::2] = array("Q", high)
+        words[1::2] = array("Q", low)
+        if sys.byteorder == "little":
+            words.byteswap()
+        packed = words.tobytes()
+
+    view = memoryview(packed)
+    inet_ntoa = socket.inet_ntoa
+    inet_ntop = socket.inet_ntop
+    af_inet6 = socket.AF_INET6
+    result = []
+    for i in range(0, len(packed), 16):
+        if packed.startswith(IPV4_MAPPED_PREFIX, i):
+            result.append(inet_ntoa(view[i + 12:i + 16]))
+        else:
+            result.append(inet_ntop(af_inet6, view[i:i + 16]))
+    return result
+
+
+DEFAULT_CHUNK_SIZE: int = 4 * 1024 * 1024
+
+IPV4_PATTERN = re.compile(
+    rb"(?<![\d.])"
+    rb"(?:(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.){3}"
+    rb"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
+    rb"(?!\.?\d)"
+)
+
+# Bytes a match may still need at the end of a buffer: the longest dotted
+# quad (15) plus the two bytes its (?!\.?\d) lookahead inspects
+IPV4_PENDING_BYTES: int = 17
+
+
+def make_ip_rewriter(mode: str, anonymize_bits: int = 8) -> Callable[[re.Match], bytes]:
+    """
+    Build a re.sub callback rewriting a matched address to int, hex or
+    anonymized form (the low anonymize_bits bits zeroed). Results are
+    cached because log files repeat the same addresses over and over.
+    """
+    if mode == "int":
+        def convert(ip: bytes) -> bytes:
+            return str(ip_to_int(ip.decode("ascii"))).encode("ascii")
+    elif mode == "hex":
+        def convert(ip: bytes) -> bytes:
+            return ip_to_hex(ip.decode("ascii")).encode("ascii")
+    elif mode == "anon":
+        mask = ~((1 << anonymize_bits) - 1) & 0xFFFFFFFF
+
+        def convert(ip: bytes) -> bytes:
+            return int_to_ip(ip_to_int(ip.decode("ascii")) & mask).encode("ascii")
+    else:
+        raise ValueError(f"Unknown rewrite mode: {mode}")
+
+    cached_convert = lru_cache(maxsize=65536)(convert)
+    return lambda match: cached_convert(match.group())
+
+
+def rewrite_stream(
+    source: BinaryIO,
+    target: BinaryIO,
+    rewriter: Callable[[re.Match], bytes],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    limit: int = -1,
+) -> None:
+    """
+    Rewrite addresses from source into target chunk by chunk. Only whole
+    lines are handed to the regex, the trailing partial line is carried
+    over to the next chunk. limit (bytes) stops reading early, -1 reads to EOF.
+
+    A line longer than chunk_size is not buffered whole: everything but
+    its last IPV4_PENDING_BYTES is settled and written, so memory stays
+    bounded by chunk_size on newline-free input too.
+    """
+    carry = b""
+    # 1 when carry starts with an already written byte kept for the lookbehind
+    skip = 0
+    remaining = limit
+    while remaining != 0:
+        read_size = chunk_size if remaining < 0 else min(chunk_size, remaining)
+        chunk = source.read(read_size)
+        if not chunk:
+            break
+        if remaining > 0:
+            remaining -= len(chunk)
+
+        buffer = carry + chunk
+        cut = buffer.rfind(b"\n", skip) + 1
+        if cut:
+            target.write(_rewrite_range(buffer, skip, cut, rewriter))
+            carry, skip = buffer[cut:], 0
+        else:
+            carry = buffer
+
+        if len(carry) - skip > max(chunk_size, 4 * IPV4_PENDING_BYTES):
+            settled, cut = _rewrite_settled(carry, skip, rewriter)
+            target.write(settled)
+            carry, skip = carry[cut - 1:], 1
+
+    if len(carry) > skip:
+        target.write(_rewrite_range(carry, skip, len(carry), rewriter))
+
+
+def _rewrite_range(
+    buffer: bytes, start: int, end: int, rewriter: Callable[[re.Match], bytes]
+) -> bytes:
+    """IPV4_PATTERN.sub over buffer[start:end], buffer[:start] stays visible to the lookbehind"""
+    if start == 0 and end == len(buffer):
+        return IPV4_PATTERN.sub(rewriter, buffer)
+    parts = []
+    last = start
+    for match in IPV4_PATTERN.finditer(buffer, start, end):
+        parts += (buffer[last:match.start()], rewriter(match))
+        last = match.end()
+    parts.append(buffer[last:end])
+    return b"".join(parts)
+
+
+def _rewrite_settled(
+    buffer: bytes, start: int, rewriter: Callable[[re.Match], bytes]
+) -> tuple[bytes, int]:
+    """
+    Rewrite the part of an unterminated buffer that later bytes can no
+    longer change. Returns (output, cut): buffer[start:cut] is settled,
+    buffer[cut:] must wait for more input.
+    """
+    settled = len(buffer) - IPV4_PENDING_BYTES
+    parts = []
+    last = start
+    for match in IPV4_PATTERN.finditer(buffer, start):
+        if match.start() >= settled:
+            break
+        parts += (buffer[last:match.start()], rewriter(match))
+        last = match.end()
+    cut = max(last, settled)
+    parts.append(buffer[last:cut])
+    return b"".join(parts), cut
+
+
+def split_file_by_lines(file_path: str, parts: int) -> list[tuple[int, int]]:
+    """Split a file into up to parts byte ranges, each starting at a line boundary"""
+    size = os.path.getsize(file_path)
+    boundaries = [0]
+    with open(file_path, "rb") as f:
+        for i in range(1, parts):
+            offset = size * i // parts
+            if offset <= boundaries[-1]:
+                continue
+            f.seek(offset - 1)
+            f.readline()
+            offset = f.tell()
+            if boundaries[-1] < offset < size:
+                boundaries.append(offset)
+    boundaries.append(size)
+    return [
+        (start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start
+    ]
+
+
+def _rewrite_file_range(
+    file_path: str, start: int, end: int, part_path: str,
+    mode: str, anonymize_bits: int, chunk_size: int,
+) -> str:
+    rewriter = make_ip_rewriter(mode, anonymize_bits)
+    with open(file_path, "rb") as source, open(part_path, "wb") as target:
+        source.seek(start)
+        rewrite_stream(source, target, rewriter, chunk_size, end - start)
+    return part_path
+
+
+def rewrite_file_parallel(
+    file_path: str, target: BinaryIO, mode: str, workers: int,
+    anonymize_bits: int = 8, chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> None:
+    """Rewrite one file with worker processes, then concatenate the parts in order"""
+    ranges = split_file_by_lines(file_path, workers)
+    with tempfile.TemporaryDirectory(prefix="ip_rewrite_") as tmp_dir:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _rewrite_file_range, file_path, start, end,
+                    os.path.join(tmp_dir, f"part_{i:05d}"),
+                    mode, anonymize_bits, chunk_size,
+                )
+                for i, (start, end) in enumerate(ranges)
+            ]
+            part_paths = [future.result() for future in futures]
+
+        for part_path in part_paths:
+            with open(part_path, "rb") as part:
+                shutil.copyfileobj(part, target, chunk_size)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Rewrite IPv4 addresses in log files to int, hex or anonymized form"
+    )
+    parser.add_argument("input", nargs="?", default="-", help="Input log file ('-' for stdin)")
+    parser.add_argument("-m", "--mode", choices=["int", "hex", "anon"], default="int",
+                        help="Rewrite target (default: int)")
+    parser.add_argument("-o", "--output", default="-", help="Output file ('-' for stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Worker processes, splits the input file by line-aligned byte ranges")
+    parser.add_argument("--anonymize-bits", type=int, default=8,
+                        help="Low bits zeroed in anon mode (default: 8)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Read chunk size in bytes")
+    args = parser.parse_args()
+
+    if not 0 <= args.anonymize_bits <= 32:
+        parser.error("--anonymize-bits must be between 0 and 32")
+    if args.workers < 1 or args.chunk_size < 1:
+        parser.error("--workers and --chunk-size must be positive")
+    if args.workers > 1 and args.input == "-":
+        parser.error("--workers needs a regular input file, not stdin")
+    return args
+
+
+def main() -> None:
+    args = parse_arguments()
+
+    target = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        if args.workers > 1:
+            rewrite_file_parallel(
+                args.input, target, args.mode, args.workers,
+                args.anonymize_bits, args.chunk_size,
+            )
+        else:
+            rewriter = make_ip_rewriter(args.mode, args.anonymize_bits)
+            source = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+            try:
+                rewrite_stream(source, target, rewriter, args.chunk_size)
+            finally:
+                if source is not sys.stdin.buffer:
+                    source.close()
+    finally:
+        if target is not sys.stdout.buffer:
+            target.close()
+        else:
+            target.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,179 @@
-import os
+from text_files_walker import walk_text_files
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import tempfile
+import shutil
+import mmap
 import sys
+import os
 
 
-def convert_lf_and_crlf(file_path, mode):
-    try:
-        with open(file_path, 'rb') as file:
-            content = file.read()
-        
-        if mode:
-            content = content.replace(b'\n', b'\r\n')
-            
+CHUNK_SIZE = 1024 * 1024
+
+
+def convert_line_endings_stream(source, target, mode, chunk_size=CHUNK_SIZE):
+    """
+    Copy source to target converting line endings chunk by chunk.
+    mode True converts to CRLF (existing CRLF is kept, not doubled),
+    mode False converts CRLF to LF. A '\\r' at the end of a chunk is held
+    back until the next chunk shows whether a '\\n' follows it.
+    """
+    carry = b''
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+
+        chunk = carry + chunk
+        if chunk.endswith(b'\r'):
+            carry = b'\r'
+            chunk = chunk[:-1]
         else:
-            content = content.replace(b'\r\n', b'\n')
-        
-        with open(file_path, 'wb') as file:
-            file.write(content)
-            print(f"Conversion completed: {file_path}")
+            carry = b''
+
+        chunk = chunk.replace(b'\r\n', b'\n')
+        if mode:
+            chunk = chunk.replace(b'\n', b'\r\n')
+        target.write(chunk)
+
+    target.write(carry)
+
+
+def count_line_endings(file_path, chunk_size=CHUNK_SIZE):
+    """ Return (crlf, bare_lf) counts, reading the file in chunks """
+    crlf = lf = 0
+    previous_cr = False
+    with open(file_path, 'rb') as file:
+        while chunk := file.read(chunk_size):
+            lf += chunk.count(b'\n')
+            crlf += chunk.count(b'\r\n') + (previous_cr and chunk.startswith(b'\n'))
+            previous_cr = chunk.endswith(b'\r')
+    return crlf, lf - crlf
+
+
+def classify_line_endings(file_path):
+    """ One of 'none', 'lf', 'crlf' or 'mixed' """
+    crlf, bare_lf = count_line_endings(file_path)
+    if crlf and bare_lf:
+        return 'mixed'
+    if crlf:
+        return 'crlf'
+    return 'lf' if bare_lf else 'none'
+
+
+def needs_conversion(file_path, mode):
+    """
+    Cheap probe whether a file differs from the target line ending.
+    For LF a single mmap find for CRLF is enough; for CRLF the chunked
+    counts tell whether any bare LF is left.
+    """
+    if mode:
+        return count_line_endings(file_path)[1] > 0
+
+    if os.path.getsize(file_path) == 0:
+        return False
+    with open(file_path, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return mapped.find(b'\r\n') != -1
+
+
+def convert_lf_and_crlf(file_path, mode, chunk_size=CHUNK_SIZE):
+    """
+    Convert one file in bounded memory. The result goes to a temp file in
+    the same directory which then atomically replaces the original, so an
+    interrupted run never leaves a half-written file behind.
+    """
+    tmp_path = None
+    try:
+        directory = os.path.dirname(os.path.abspath(file_path))
+        with open(file_path, 'rb') as source, tempfile.NamedTemporaryFile(
+            'wb', dir=directory, prefix='.line_endings_', delete=False
+        ) as target:
+            tmp_path = target.name
+            convert_line_endings_stream(source, target, mode, chunk_size)
+
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+        tmp_path = None
+        print(f"Conversion completed: {file_path}")
+        return True
 
     except Exception as e:
         print(f"Error processing file {file_path}: {e}")
+        return False
 
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-def process_directory(directory, extensions, mode):
-    """ Traverse a directory and convert files with specified extensions """
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith(extensions):
-                file_path = os.path.join(root, file)
-                convert_lf_and_crlf(file_path, mode)
+
+def process_file(file_path, mode, dry_run=False):
+    """ Returns 'converted', 'skipped' or 'failed' (dry runs only report) """
+    try:
+        if dry_run:
+            kind = classify_line_endings(file_path)
+            if kind == 'mixed':
+                print(f"Mixed line endings: {file_path}")
+            target_kind = 'crlf' if mode else 'lf'
+            if kind in ('none', target_kind):
+                return 'skipped'
+            print(f"Would convert ({kind} -> {target_kind}): {file_path}")
+            return 'converted'
+
+        if not needs_conversion(file_path, mode):
+            return 'skipped'
+    except Exception as e:
+        print(f"Error processing file {file_path}: {e}")
+        return 'failed'
+
+    return 'converted' if convert_lf_and_crlf(file_path, mode) else 'failed'
+
+
+def process_directory(directory, extensions, mode, workers=1, dry_run=False, use_ignore_files=True):
+    """
+    Traverse a directory and convert text files with specified extensions,
+    skipping binaries and anything matched by .gitignore files
+    """
+    file_paths = walk_text_files(directory, extensions, use_ignore_files)
+    if workers <= 1:
+        results = [process_file(file_path, mode, dry_run) for file_path in file_paths]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda path: process_file(path, mode, dry_run), file_paths
+            ))
+
+    converted_label = "would be converted" if dry_run else "converted"
+    print(
+        f"{results.count('converted')} files {converted_label}, "
+        f"{results.count('skipped')} already in target form, {results.count('failed')} failed"
+    )
+    return results.count('failed') == 0
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python convert_line_endings.py <directory> <extension1> <extension2> ...")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Convert line endings of files in a directory")
+    parser.add_argument("directory", help="Directory to process recursively")
+    parser.add_argument("extensions", nargs="+", help="File extensions to convert, e.g. .py .txt")
+    parser.add_argument("--crlf", action="store_true", help="Convert LF to CRLF instead of CRLF to LF")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="Only report files that would change and files with mixed endings")
+    parser.add_argument("--no-ignore", action="store_true",
+                        help="Do not honour .gitignore files (default ignores still apply)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of files converted concurrently (default: CPU count)")
+    args = parser.parse_args()
 
-    target_directory = sys.argv[1]
+    target_directory = args.directory
 
-    file_extensions = tuple(sys.argv[2:])
+    file_extensions = tuple(args.extensions)
 
     if not os.path.isdir(target_directory):
         print(f"Error: Directory '{target_directory}' does not exist")
         sys.exit(1)
 
-    process_directory(target_directory, file_extensions, False)
+    process_directory(
+        target_directory, file_extensions, args.crlf, args.workers, args.dry_run,
+        not args.no_ignore
+    )
     print("Processing Complete!")
@@ -1,5 +1,179 @@
+from replacement_rules import ReplacementRules
+from text_files_walker import walk_text_files
+import argparse
+import tempfile
 import sys
 import os
+import re
+
+
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+
+
+def latex_delimiter_rules():
+    r"""
+    Replacement rules:
+    - \[ replaced with $$
+    - \] replaced with $$
+    - \( replaced with $
+    - \) replaced with $
+    """
+    return (
+        ReplacementRules()
+        .add_literal(r'\[', '$$')
+        .add_literal(r'\]', '$$')
+        .add_literal(r'\(', '$')
+        .add_literal(r'\)', '$')
+    )
+
+
+FENCE_PATTERN = re.compile(r' {0,3}(`{3,}|~{3,})(.*)')
+
+# An escaped backtick never opens a code span
+OPENING_BACKTICKS_PATTERN = re.compile(r'\\`|`+')
+BACKTICKS_PATTERN = re.compile(r'`+')
+
+
+class MarkdownProseTransformer:
+    """
+    Line-streaming Markdown tokenizer that applies rules to prose only.
+    Fenced code blocks and inline code spans pass through untouched.
+
+    An inline code span may continue on the following lines of the same
+    paragraph, so text after an unclosed backtick run is held back until
+    the matching run shows up; if the paragraph ends first, the run was
+    literal text and the held-back lines are rewritten as prose. Memory is
+    therefore bounded by the longest paragraph, not by the document.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._fence = None  # (fence char, fence length) inside a code block
+        self._pending = ''
+        self.changed = False
+
+    def _rewrite(self, prose):
+        rewritten = self.rules.apply(prose)
+        if rewritten != prose:
+            self.changed = True
+        return rewritten
+
+    def _split_code_spans(self, text, final):
+        """
+        Rewrite the prose parts of text. Returns (output, rest) where rest
+        starts at an unclosed backtick run (always '' when final is set).
+        """
+        output = []
+        prose_start = position = 0
+        while (opening := OPENING_BACKTICKS_PATTERN.search(text, position)) is not None:
+            run = opening.group()
+            if run == '\\`':
+                position = opening.end()
+                continue
+
+            closing = next(
+                (m for m in BACKTICKS_PATTERN.finditer(text, opening.end()) if len(m.group()) == len(run)),
+                None
+            )
+            if closing is not None:
+                output.append(self._rewrite(text[prose_start:opening.start()]))
+                output.append(text[opening.start():closing.end()])
+                prose_start = position = closing.end()
+            elif final:
+                position = opening.end()
+            else:
+                output.append(self._rewrite(text[prose_start:opening.start()]))
+                return ''.join(output), text[opening.start():]
+
+        output.append(self._rewrite(text[prose_start:]))
+        return ''.join(output), ''
+
+    def _flush_pending(self):
+        if not self._pending:
+            return ''
+        output, _ = self._split_code_spans(self._pending, final=True)
+        self._pending = ''
+        return output
+
+    def feed(self, line):
+        """ Process one line (with its line ending), return the text ready for output """
+        if self._fence is not None:
+            match = FENCE_PATTERN.fullmatch(line.rstrip('\r\n'))
+            fence_char, fence_length = self._fence
+            if (
+                match and match.group(1)[0] == fence_char
+                and len(match.group(1)) >= fence_length and not match.group(2).strip()
+            ):
+                self._fence = None
+            return line
+
+        stripped = line.rstrip('\r\n')
+        fence = FENCE_PATTERN.fullmatch(stripped)
+        if fence and not (fence.group(1)[0] == '`' and '`' in fence.group(2)):
+            self._fence = (fence.group(1)[0], len(fence.group(1)))
+            return self._flush_pending() + line
+
+        if not stripped.strip():
+            # A blank line ends the paragraph, no code span can continue
+            return self._flush_pending() + line
+
+        output, self._pending = self._split_code_spans(self._pending + line, final=False)
+        return output
+
+    def close(self):
+        return self._flush_pending()
+
+    def transform(self, lines):
+        for line in lines:
+            output = self.feed(line)
+            if output:
+                yield output
+        output = self.close()
+        if output:
+            yield output
+
+
+def replace_in_file(file_path, rules, prose_only=True):
+    """
+    Apply all rules to one file. With prose_only the file is streamed
+    line by line through MarkdownProseTransformer, leaving code intact;
+    otherwise the rules run over the whole text in a single pass. The
+    output goes to a temp file that replaces the original (atomic rename)
+    only when something changed. Returns True if the file was modified.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    changed = False
+    with open(file_path, 'r', encoding='utf-8', newline='') as source, tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', newline='', dir=directory, prefix='.md_replace_', delete=False
+    ) as target:
+        tmp_path = target.name
+        try:
+            if prose_only:
+                transformer = MarkdownProseTransformer(rules)
+                for line in source:
+                    target.write(transformer.feed(line))
+                target.write(transformer.close())
+                changed = transformer.changed
+            else:
+                content = source.read()
+                new_content = rules.apply(content)
+                changed = new_content != content
+                target.write(new_content)
+        except Exception:
+            target.close()
+            os.remove(tmp_path)
+            raise
+
+    try:
+        if changed:
+            os.replace(tmp_path, file_path)
+        else:
+            os.remove(tmp_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return changed
 
 
 def replace_latex_delimiters(file_path):
@@ -21,42 +195,56 @@ def replace_latex_delimiters(file_path):
     print(f"Processing file: {file_path}")
 
     try:
-        # 1. Read file content
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        replace_in_file(file_path, latex_delimiter_rules())
+        print("Replacement completed.")
 
-        # 2. Perform replacements
-        # Note: In Python strings, backslash '\' is an escape character.
-        # To match literal '\[', we need to write '\\[' in the Python string,
-        # so it becomes '\[' in memory.
-        # To match \(, write '\\('.
+    except Exception as e:
+        print(f"Error occurred while processing file: {e}", file=sys.stderr)
+        sys.exit(1)
 
-        # Replace \[ with $$ and \] with $$
-        content = content.replace(r'\[', '$$')
-        content = content.replace(r'\]', '$$')
 
-        # Replace \( with $ and \) with $
-        content = content.replace(r'\(', '$')
-        content = content.replace(r'\)', '$')
+def iter_markdown_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            yield from walk_text_files(path, MARKDOWN_EXTENSIONS)
+        else:
+            yield path
 
-        # 3. Write modified content back to the original file (in-place modification)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
 
-        print("Replacement completed.")
+def replace_in_paths(paths, rules, prose_only=True):
+    """ Apply rules to every file given directly or found under a directory """
+    changed = unchanged = failed = 0
+    for file_path in iter_markdown_files(paths):
+        try:
+            if replace_in_file(file_path, rules, prose_only):
+                changed += 1
+                print(f"Updated: {file_path}")
+            else:
+                unchanged += 1
+        except Exception as e:
+            failed += 1
+            print(f"Error occurred while processing file {file_path}: {e}", file=sys.stderr)
 
-    except Exception as e:
-        print(f"Error occurred while processing file: {e}", file=sys.stderr)
-        sys.exit(1)
+    print(f"{changed} files updated, {unchanged} unchanged, {failed} failed")
+    return failed == 0
 
 
 if __name__ == "__main__":
-    # Check if a filename argument is provided
-    if len(sys.argv) < 2:
-        print(f"Usage: {sys.argv[0]} <filename>", file=sys.stderr)
-        print(f"  Example: {sys.argv[0]} my_text_file.txt", file=sys.stderr)
+    parser = argparse.ArgumentParser(
+        description="Replace LaTeX math delimiters (or custom rules) in Markdown files"
+    )
+    parser.add_argument("paths", nargs="+", help="Markdown files or directories to process recursively")
+    parser.add_argument("-r", "--rules", default=None,
+                        help='JSON rule file: [{"old": "...", "new": "...", "regex": false}, ...]')
+    parser.add_argument("--everywhere", action="store_true",
+                        help="Also rewrite inside fenced code blocks and inline code")
+    args = parser.parse_args()
+
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        print(f"Error: File '{missing[0]}' does not exist.", file=sys.stderr)
         sys.exit(1)
 
-    file_name = sys.argv[1]
-    replace_latex_delimiters(file_name)
-    
\ No newline at end of file
+    rules = ReplacementRules.from_json_file(args.rules) if args.rules else latex_delimiter_rules()
+    if not replace_in_paths(args.paths, rules, prose_only=not args.everywhere):
+        sys.exit(1)
@@ -0,0 +1,219 @@
+from typing import Optional
+import json
+import re
+
+
+# Python reads \0 and three octal digits as an octal escape, anything else as a group number
+OCTAL_ESCAPE_PATTERN = re.compile(r'0[0-7]{0,2}|[0-7]{3}')
+GROUP_NUMBER_PATTERN = re.compile(r'\d{1,2}')
+CONDITIONAL_GROUP_PATTERN = re.compile(r'\(\?\((\w+)\)')
+NAMED_GROUP_PATTERN = re.compile(r'\(\?P<(\w+)>')
+NAMED_REFERENCE_PATTERN = re.compile(r'\(\?P=(\w+)\)')
+TEMPLATE_GROUP_PATTERN = re.compile(r'g<(\w+)>')
+LEADING_FLAGS_PATTERN = re.compile(r'\(\?([aiLmsux]+)\)')
+
+# Groups past 99 can only be referenced by name inside a pattern
+MAX_PATTERN_GROUP_REFERENCE = 99
+
+
+def scope_global_flags(source: str) -> str:
+    """
+    Turn leading global flags such as (?i) into a scoped (?i:...) group,
+    since global flags are only allowed at the start of the combined pattern
+    """
+    flags = ""
+    position = 0
+    while (leading := LEADING_FLAGS_PATTERN.match(source, position)) is not None:
+        flags += leading.group(1)
+        position = leading.end()
+    if not flags:
+        return source
+    return f"(?{flags}:{source[position:]})"
+
+
+def shift_pattern_references(source: str, offset: int, name_prefix: str = "") -> str:
+    r"""
+    Renumber the numeric backreferences (\N and (?(N)...)) of a pattern
+    that is embedded after offset other groups in a combined pattern, and
+    prefix its group names ((?P<name>, (?P=name), (?(name)...)) with
+    name_prefix so rules may reuse the same names.
+    """
+    def shifted(number: int) -> int:
+        if number + offset > MAX_PATTERN_GROUP_REFERENCE:
+            raise ValueError(
+                f"Backreference \\{number} in {source!r} needs group {number + offset}; "
+                "use named groups in rules that follow many other groups"
+            )
+        return number + offset
+
+    output: list[str] = []
+    position = 0
+    in_class = False
+    while position < len(source):
+        char = source[position]
+        if char == '\\':
+            octal = OCTAL_ESCAPE_PATTERN.match(source, position + 1)
+            number = GROUP_NUMBER_PATTERN.match(source, position + 1)
+            if not in_class and octal is None and number is not None:
+                # Wrapped so a following literal digit is not read as part of the number
+                output.append(f"(?:\\{shifted(int(number.group()))})")
+                position = number.end()
+            else:
+                output.append(source[position:position + 2])
+                position += 2
+        elif in_class:
+            in_class = char != ']'
+            output.append(char)
+            position += 1
+        elif char == '[':
+            # A ']' right after '[' or '[^' is a literal member of the class
+            end = position + 1
+            if source.startswith('^', end):
+                end += 1
+            if source.startswith(']', end):
+                end += 1
+            output.append(source[position:end])
+            position = end
+            in_class = True
+        elif (conditional := CONDITIONAL_GROUP_PATTERN.match(source, position)) is not None:
+            group = conditional.group(1)
+            output.append(f"(?({shifted(int(group)) if group.isdigit() else name_prefix + group})")
+            position = conditional.end()
+        elif (named := NAMED_GROUP_PATTERN.match(source, position)) is not None:
+            output.append(f"(?P<{name_prefix}{named.group(1)}>")
+            position = named.end()
+        elif (reference := NAMED_REFERENCE_PATTERN.match(source, position)) is not None:
+            output.append(f"(?P={name_prefix}{reference.group(1)})")
+            position = reference.end()
+        else:
+            output.append(char)
+            position += 1
+    return ''.join(output)
+
+
+def shift_template_references(replacement: str, offset: int, name_prefix: str = "") -> str:
+    r"""
+    Renumber \N and \g<N> in a replacement template by offset groups and
+    prefix the names in \g<name> with name_prefix
+    """
+    output: list[str] = []
+    position = 0
+    while position < len(replacement):
+        char = replacement[position]
+        if char != '\\':
+            output.append(char)
+            position += 1
+            continue
+
+        octal = OCTAL_ESCAPE_PATTERN.match(replacement, position + 1)
+        number = GROUP_NUMBER_PATTERN.match(replacement, position + 1)
+        named = TEMPLATE_GROUP_PATTERN.match(replacement, position + 1)
+        if octal is None and number is not None:
+            output.append(f"\\g<{int(number.group()) + offset}>")
+            position = number.end()
+        elif named is not None:
+            group = named.group(1)
+            output.append(f"\\g<{int(group) + offset if group.isdigit() else name_prefix + group}>")
+            position = named.end()
+        else:
+            output.append(replacement[position:position + 2])
+            position += 2
+    return ''.join(output)
+
+
+class ReplacementRules:
+    """
+    A set of literal and regex replacements compiled into one alternation,
+    so a document is rewritten in a single pass instead of one full copy
+    per rule. At any position the first rule (in insertion order) that
+    matches wins; replaced text is never rescanned by later rules.
+    """
+
+    def __init__(self):
+        # (regex source, replacement, is_literal)
+        self._rules: list[tuple[str, str, bool]] = []
+        self._pattern: Optional[re.Pattern] = None
+        # Per rule: the replacement template renumbered for the combined pattern
+        self._templates: list[Optional[str]] = []
+
+    def add_literal(self, old: str, new: str) -> "ReplacementRules":
+        if not old:
+            raise ValueError("Literal replacement source must not be empty")
+        self._rules.append((re.escape(old), new, True))
+        self._pattern = None
+        return self
+
+    def add_regex(self, pattern: str, replacement: str) -> "ReplacementRules":
+        """
+        replacement may use \\1 / \\g<name> references to the rule's own
+        groups. Raises ValueError if the rule is invalid on its own or
+        cannot be combined with the rules added before it.
+        """
+        try:
+            # sub() parses the template up front, even when nothing matches
+            re.compile(pattern).sub(replacement, "")
+        except (re.error, IndexError) as e:
+            raise ValueError(f"Invalid regex rule {pattern!r} -> {replacement!r}: {e}") from e
+        self._rules.append((pattern, replacement, False))
+        self._pattern = None
+        try:
+            self._compile()
+        except (re.error, ValueError) as e:
+            self._rules.pop()
+            self._pattern = None
+            raise ValueError(f"Regex rule {pattern!r} cannot be combined with the other rules: {e}") from e
+        return self
+
+    @classmethod
+    def from_json_file(cls, file_path: str) -> "ReplacementRules":
+        """
+        Load rules from a JSON list of {"old": ..., "new": ...} objects,
+        with "regex": true for regular expressions. Raises ValueError naming
+        the first entry that does not compile.
+        """
+        with open(file_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        rules = cls()
+        for number, entry in enumerate(entries, 1):
+            try:
+                if entry.get("regex"):
+                    rules.add_regex(entry["old"], entry["new"])
+                else:
+                    rules.add_literal(entry["old"], entry["new"])
+            except ValueError as e:
+                raise ValueError(f"{file_path}: rule {number}: {e}") from e
+        rules._compile()
+        return rules
+
+    def _compile(self) -> re.Pattern:
+        if self._pattern is None:
+            # Each rule's own groups follow its outer group, so group N of
+            # the rule is group N + offset of the combined match; names get
+            # a per-rule prefix so two rules can both define (?P<name>...)
+            sources: list[str] = []
+            templates: list[Optional[str]] = []
+            offset = 0
+            for i, (source, replacement, is_literal) in enumerate(self._rules):
+                offset += 1
+                name_prefix = f"_r{i}_"
+                embedded = shift_pattern_references(scope_global_flags(source), offset, name_prefix)
+                sources.append(f"(?P<_rule{i}>{embedded})")
+                templates.append(None if is_literal else shift_template_references(replacement, offset, name_prefix))
+                offset += re.compile(source).groups
+            # Outer groups close last, so match.lastgroup names the rule
+            self._pattern = re.compile("|".join(sources))
+            self._templates = templates
+        return self._pattern
+
+    def _replace_match(self, match: re.Match) -> str:
+        index = int(match.lastgroup[5:])
+        template = self._templates[index]
+        if template is None:
+            return self._rules[index][1]
+        return match.expand(template)
+
+    def apply(self, text: str) -> str:
+        if not self._rules:
+            return text
+        return self._compile().sub(self._replace_match, text)
+
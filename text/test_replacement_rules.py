@@ -0,0 +1,57 @@
+from replacement_rules import ReplacementRules
+import unittest
+
+
+class ReplacementRulesTest(unittest.TestCase):
+
+    def test_literal_rules_apply_in_one_pass(self):
+        rules = ReplacementRules().add_literal("a", "b").add_literal("b", "c")
+        self.assertEqual(rules.apply("ab"), "bc")
+
+    def test_replacement_groups_follow_the_rule(self):
+        rules = ReplacementRules().add_regex(r"(x)(y)", r"\2\1").add_regex(r"(\d+)-(\d+)", r"\g<2>-\1")
+        self.assertEqual(rules.apply("xy 1-22"), "yx 22-1")
+
+    def test_backreference_in_pattern(self):
+        rules = ReplacementRules().add_regex(r"(\w)\1", r"<\1>")
+        self.assertEqual(rules.apply("aa"), "<a>")
+
+    def test_backreference_after_other_rules(self):
+        rules = (
+            ReplacementRules()
+            .add_regex(r"(q)(z)", r"\2")
+            .add_regex(r"(\w)\1", r"[\1]")
+        )
+        self.assertEqual(rules.apply("qz bb b"), "z [b] b")
+
+    def test_lookaround(self):
+        rules = ReplacementRules().add_regex(r"foo(?=bar)", "F").add_regex(r"(?<=x)y", "Y")
+        self.assertEqual(rules.apply("foobar foo xy y"), "Fbar foo xY y")
+
+    def test_escapes_and_classes_are_not_renumbered(self):
+        rules = ReplacementRules().add_literal("-", "+").add_regex(r"[\1](\w)\0", r"\1\n")
+        self.assertEqual(rules.apply("\x01k\x00-"), "k\n+")
+
+    def test_leading_global_flags_apply_to_their_rule(self):
+        rules = ReplacementRules().add_literal("x", "y").add_regex(r"(?i)foo", "bar")
+        self.assertEqual(rules.apply("FOO x Foo"), "bar y bar")
+
+    def test_rules_may_reuse_group_names(self):
+        rules = (
+            ReplacementRules()
+            .add_regex(r"(?P<a>\d)-(?P=a)", r"<\g<a>>")
+            .add_regex(r"(?P<a>[xy])(?(a)!)", r"[\g<a>]")
+        )
+        self.assertEqual(rules.apply("1-1 1-2 x!"), "<1> 1-2 [x]")
+
+    def test_invalid_rule_fails_when_added(self):
+        rules = ReplacementRules().add_regex(r"(a)", r"\1")
+        with self.assertRaises(ValueError):
+            rules.add_regex(r"(b)", r"\g<missing>")
+        with self.assertRaises(ValueError):
+            rules.add_regex(r"b(?i)", "c")
+        self.assertEqual(rules.apply("ab"), "ab")
+
+
+if __name__ == "__main__":
+    unittest.main()
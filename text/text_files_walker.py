@@ -0,0 +1,173 @@
+from typing import Iterable, Iterator, Optional
+import re
+import os
+
+
+DEFAULT_IGNORE_PATTERNS: list[str] = [
+    ".git/",
+    ".hg/",
+    ".svn/",
+    "node_modules/",
+    "__pycache__/",
+    ".venv/",
+    "venv/",
+    ".idea/",
+]
+
+BINARY_SNIFF_SIZE = 8192
+
+TEXT_BOMS: tuple[bytes, ...] = (
+    b"\xff\xfe", b"\xfe\xff",  # UTF-16 (and UTF-32 LE starts with ff fe too)
+    b"\x00\x00\xfe\xff",       # UTF-32 BE
+)
+
+
+def _translate_segment(segment: str) -> str:
+    """ Glob segment to regex: '*' and '?' never cross '/', [...] classes kept """
+    i, result = 0, []
+    while i < len(segment):
+        char = segment[i]
+        if char == "*":
+            result.append("[^/]*")
+        elif char == "?":
+            result.append("[^/]")
+        elif char == "\\" and i + 1 < len(segment):
+            i += 1
+            result.append(re.escape(segment[i]))
+        elif char == "[":
+            end = segment.find("]", i + 2)
+            if end == -1:
+                result.append(re.escape(char))
+            else:
+                body = segment[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                result.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        else:
+            result.append(re.escape(char))
+        i += 1
+    return "".join(result)
+
+
+def translate_ignore_pattern(pattern: str, base: str = "") -> str:
+    """
+    Translate one .gitignore pattern, relative to the directory base
+    ('' for the walk root), into a regex over '/'-separated relative
+    paths. Directories are matched with a trailing '/'.
+    """
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    # A slash anywhere but at the end anchors the pattern to base
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    segments = pattern.split("/")
+    parts = []
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
+        if segment == "**":
+            parts.append(".*" if last else "(?:[^/]+/)*")
+        else:
+            parts.append(_translate_segment(segment) + ("" if last else "/"))
+
+    prefix = re.escape(base + "/") if base else ""
+    if not anchored:
+        prefix += "(?:[^/]+/)*"
+    return prefix + "".join(parts) + ("/" if dir_only else "/?")
+
+
+class IgnoreMatcher:
+    """
+    All ignore rules compiled into a single regex. Alternatives are laid
+    out in reverse, so fullmatch picks the last matching rule, which is
+    the one git applies; its group name says whether it was a '!' rule.
+    """
+
+    def __init__(self, rules: Optional[list[tuple[str, bool]]] = None):
+        # rules: (regex, negated) in file order
+        self.rules: list[tuple[str, bool]] = rules or []
+        self._regex: Optional[re.Pattern] = None
+        if self.rules:
+            self._regex = re.compile("|".join(
+                f"(?P<{'n' if negated else 'p'}{i}>{regex})"
+                for i, (regex, negated) in reversed(list(enumerate(self.rules)))
+            ))
+
+    def extend(self, lines: Iterable[str], base: str = "") -> "IgnoreMatcher":
+        """ New matcher with the rules of an ignore file located at base added """
+        rules = list(self.rules)
+        for line in lines:
+            line = line.rstrip("\n").rstrip("\r")
+            if not line.endswith("\\ "):
+                line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated or line.startswith("\\"):
+                line = line[1:]
+            if line:
+                rules.append((translate_ignore_pattern(line, base), negated))
+        return IgnoreMatcher(rules)
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        if self._regex is None:
+            return False
+        match = self._regex.fullmatch(rel_path + "/" if is_dir else rel_path)
+        return match is not None and match.lastgroup.startswith("p")
+
+
+def is_binary_file(file_path: str, sniff_size: int = BINARY_SNIFF_SIZE) -> bool:
+    """ A NUL byte in the first block means binary, unless a UTF-16/32 BOM says otherwise """
+    with open(file_path, "rb") as file:
+        block = file.read(sniff_size)
+    return b"\x00" in block and not block.startswith(TEXT_BOMS)
+
+
+def walk_text_files(
+    directory: str,
+    extensions: Optional[tuple[str, ...]] = None,
+    use_ignore_files: bool = True,
+    skip_binary: bool = True,
+    ignore_patterns: Iterable[str] = DEFAULT_IGNORE_PATTERNS,
+    ignore_filename: str = ".gitignore",
+) -> Iterator[str]:
+    """
+    Yield paths of text files under directory. Honours ignore_patterns and,
+    with use_ignore_files, every .gitignore on the way down (nested ones
+    apply to their own subtree). Ignored directories are pruned, so their
+    contents are never listed, and binary files are skipped after a
+    one-block sniff.
+    """
+    root_matcher = IgnoreMatcher().extend(ignore_patterns)
+    matchers: dict[str, IgnoreMatcher] = {}
+
+    for root, dirs, files in os.walk(directory):
+        rel_root = os.path.relpath(root, directory).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root
+
+        parent = rel_root.rpartition("/")[0] if rel_root else None
+        matcher = matchers.get(parent, root_matcher) if parent is not None else root_matcher
+        if use_ignore_files and ignore_filename in files:
+            try:
+                with open(os.path.join(root, ignore_filename), "r", encoding="utf-8", errors="replace") as f:
+                    matcher = matcher.extend(f, rel_root)
+            except OSError:
+                pass
+        matchers[rel_root] = matcher
+        prefix = rel_root + "/" if rel_root else ""
+
+        dirs[:] = [d for d in dirs if not matcher.is_ignored(prefix + d, True)]
+
+        for file in files:
+            if extensions is not None and not file.endswith(extensions):
+                continue
+            if matcher.is_ignored(prefix + file):
+                continue
+            file_path = os.path.join(root, file)
+            try:
+                if skip_binary and is_binary_file(file_path):
+                    continue
+            except OSError:
+                continue
+            yield file_path
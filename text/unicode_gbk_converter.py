@@ -1,65 +1,238 @@
+from concurrent.futures import ProcessPoolExecutor
+from text_files_walker import walk_text_files
 from datetime import datetime
+from typing import Optional
+import argparse
+import tempfile
+import codecs
+import shutil
 import sys
 import os
 
 
+CHUNK_SIZE = 1024 * 1024
+DETECT_SAMPLE_SIZE = 64 * 1024
+
+# Longest BOM first, the UTF-32 LE BOM starts with the UTF-16 LE one
+BOM_ENCODINGS: list[tuple[bytes, str]] = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+
+def get_logging_string(level: str, content: str) -> str:
+    return f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {level}: {content}"
+
+
+def _decodes_cleanly(sample: bytes, encoding: str, complete: bool) -> bool:
+    """ Incremental decode, so a sample cut in the middle of a character still passes """
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(sample, final=complete)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def detect_encoding(text_file: str, sample_size: int = DETECT_SAMPLE_SIZE) -> Optional[str]:
+    """
+    Guess the encoding from the leading bytes only: a BOM decides
+    directly, otherwise the sample is tried as UTF-8, then GBK, then
+    GB18030. Returns None when none of them fits.
+    """
+    with open(text_file, "rb") as f:
+        sample = f.read(sample_size)
+        complete = len(sample) < sample_size or not f.read(1)
+
+    for bom, encoding in BOM_ENCODINGS:
+        if sample.startswith(bom):
+            return encoding
+    for encoding in ("utf-8", "gbk", "gb18030"):
+        if _decodes_cleanly(sample, encoding, complete):
+            return encoding
+    return None
+
+
+def is_valid_in_encoding(text_file: str, encoding: str, chunk_size: int = CHUNK_SIZE) -> bool:
+    """
+    Cheap check whether text_file already is in encoding. Pure-ASCII
+    chunks are accepted by bytes.isascii() alone for ASCII-compatible
+    encodings; everything else is validated chunk by chunk without
+    building the decoded text. A UTF-8 BOM does not count as plain UTF-8.
+    """
+    codec_name = codecs.lookup(encoding).name
+    ascii_compatible = "ascii".encode(encoding) == b"ascii"
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        with open(text_file, "rb") as f:
+            chunk = f.read(chunk_size)
+            if codec_name == "utf-8" and chunk.startswith(codecs.BOM_UTF8):
+                return False
+            while chunk:
+                # Only skip decoding when no partial character is pending
+                if not (ascii_compatible and chunk.isascii() and not decoder.getstate()[0]):
+                    decoder.decode(chunk)
+                chunk = f.read(chunk_size)
+        decoder.decode(b"", final=True)
+        return True
+    except UnicodeError:
+        return False
+
+
+def can_skip_conversion(text_file: str, origin_encode_type: str, target_encode_type: str) -> bool:
+    """
+    Whether --skip-valid may leave text_file alone. Validating in a UTF-8
+    target is enough, since other encodings rarely form valid UTF-8. For
+    any other target it is not: most UTF-8 text is also valid GBK (the
+    UTF-8 bytes of "涓枃" read as "娑撴瀮"), so the file is only skipped if
+    it does not decode as the source encoding as well, or if the source
+    is the target (for 'auto', if detection picks the target).
+    """
+    if not is_valid_in_encoding(text_file, target_encode_type):
+        return False
+    target_name = codecs.lookup(target_encode_type).name
+    if target_name == "utf-8":
+        return True
+    if origin_encode_type == "auto":
+        detected = detect_encoding(text_file)
+        return detected is None or codecs.lookup(detected).name == target_name
+    if codecs.lookup(origin_encode_type).name == target_name:
+        return True
+    return not is_valid_in_encoding(text_file, origin_encode_type)
+
+
+def transcode_stream(source, target, origin_encode_type: str, target_encode_type: str,
+                     chunk_size: int = CHUNK_SIZE) -> None:
+    decoder = codecs.getincrementaldecoder(origin_encode_type)()
+    encoder = codecs.getincrementalencoder(target_encode_type)()
+    while chunk := source.read(chunk_size):
+        target.write(encoder.encode(decoder.decode(chunk)))
+    target.write(encoder.encode(decoder.decode(b"", final=True), final=True))
+
+
 def convert_text_file_encoding(
-        text_file, origin_encode_type, target_encode_type, output_file=None):
-    
+        text_file, origin_encode_type, target_encode_type, output_file=None,
+        skip_valid=False) -> str:
+    """
+    Convert text_file (origin_encode_type may be 'auto') by streaming it
+    through incremental codecs. In-place conversions write a temp file
+    next to the source and atomically rename it, so a crash never
+    truncates the original. With skip_valid, in-place conversions of
+    files that are already in the target encoding are skipped, as
+    decided by can_skip_conversion.
+    Returns 'converted', 'skipped' or 'failed'.
+    """
     if not isinstance(text_file, str) or text_file == "" or \
         not os.path.isfile(os.path.abspath(text_file)):
-        print(
-            f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - "
-            "ERROR: The text file path parameter error"
-        )
-        return
+        print(get_logging_string("ERROR", "The text file path parameter error"))
+        return "failed"
 
+    tmp_path = None
     try:
-        with open(text_file, "rb+") as text_file_obj:
-            text = text_file_obj.read().decode(encoding=origin_encode_type)
-            if output_file is not None:
-                with open(output_file, "x", encoding=target_encode_type) as output_file_obj:
-                    output_file_obj.write(text)
-            else:
-                text_file_obj.truncate(0)
-                text_file_obj.seek(0)
-                text_file_obj.write(text.encode(target_encode_type))
-                
-        print(
-            f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - INFO: {text_file} converted successfully"
-        )
-    except (UnicodeDecodeError, UnicodeEncodeError):
-        print(
-            f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - ERROR: Encoding conversion error in {text_file}"
-        )
+        if skip_valid and output_file is None and \
+                can_skip_conversion(text_file, origin_encode_type, target_encode_type):
+            print(get_logging_string("INFO", f"{text_file} is already {target_encode_type}, skipped"))
+            return "skipped"
+
+        if origin_encode_type == "auto":
+            origin_encode_type = detect_encoding(text_file)
+            if origin_encode_type is None:
+                print(get_logging_string("ERROR", f"Cannot detect the encoding of {text_file}"))
+                return "failed"
+
+        if output_file is not None:
+            target_path = output_file
+            target = open(output_file, "xb")
+        else:
+            target_path = text_file
+            target = tempfile.NamedTemporaryFile(
+                "wb", dir=os.path.dirname(os.path.abspath(text_file)),
+                prefix=".encoding_", delete=False
+            )
+        tmp_path = target.name
+
+        with open(text_file, "rb") as source, target:
+            transcode_stream(source, target, origin_encode_type, target_encode_type)
+
+        if output_file is None:
+            shutil.copymode(text_file, tmp_path)
+            os.replace(tmp_path, target_path)
+        tmp_path = None
+
+        print(get_logging_string(
+            "INFO", f"{text_file} converted successfully ({origin_encode_type} -> {target_encode_type})"
+        ))
+        return "converted"
+    except UnicodeError:
+        print(get_logging_string("ERROR", f"Encoding conversion error in {text_file}"))
     except (FileExistsError, PermissionError):
-        print(
-            f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - ERROR: Cannot access or write to {text_file}"
-        )
+        print(get_logging_string("ERROR", f"Cannot access or write to {text_file}"))
+    except (LookupError, OSError) as e:
+        print(get_logging_string("ERROR", f"{text_file}: {e}"))
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return "failed"
+
+
+def _convert_task(args: tuple) -> str:
+    text_file, origin_encode_type, target_encode_type, skip_valid = args
+    return convert_text_file_encoding(
+        text_file, origin_encode_type, target_encode_type, skip_valid=skip_valid
+    )
+
+
+def convert_directory_encoding(
+        dir_path, origin_encode_type, target_encode_type, workers=1,
+        skip_valid=False) -> dict[str, int]:
+    """ Recursively convert every text file under dir_path with a process pool """
+    tasks = (
+        (file_path, origin_encode_type, target_encode_type, skip_valid)
+        for file_path in walk_text_files(dir_path)
+    )
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_convert_task, tasks, chunksize=16))
+    else:
+        results = [_convert_task(task) for task in tasks]
+
+    summary = {status: results.count(status) for status in ("converted", "skipped", "failed")}
+    print(get_logging_string(
+        "INFO",
+        f"{summary['converted']} converted, {summary['skipped']} skipped, {summary['failed']} failed"
+    ))
+    return summary
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 5:
-        print("Usage:  python script.py -f/-d <from_encoding> <to_encoding> <file_path>")
-        sys.exit(1)
-
-    mode = sys.argv[1]
-    from_enc = sys.argv[2]
-    to_enc = sys.argv[3]
-    path = sys.argv[4]
-
-    if mode == "-f":
-        convert_text_file_encoding(path, from_enc, to_enc)
-    elif mode == "-d":
-        if not os.path.isdir(path):
-            print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - ERROR: Directory not found")
+    parser = argparse.ArgumentParser(description="Convert text file encodings (e.g. GBK <-> UTF-8)")
+    mode_group = parser.add_mutually_exclusive_group(required=True)
+    mode_group.add_argument("-f", action="store_true", dest="file_mode", help="Convert a single file")
+    mode_group.add_argument("-d", action="store_true", dest="dir_mode", help="Convert a directory recursively")
+    parser.add_argument("from_enc", help="Source encoding, or 'auto' to detect it per file")
+    parser.add_argument("to_enc", help="Target encoding")
+    parser.add_argument("path", help="File or directory path")
+    parser.add_argument("-s", "--skip-valid", action="store_true",
+                        help="Skip files already in the target encoding: valid UTF-8 for a UTF-8 "
+                             "target, otherwise valid in the target but not in the source encoding")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes in directory mode (default: CPU count)")
+    args = parser.parse_args()
+
+    if args.file_mode:
+        status = convert_text_file_encoding(
+            args.path, args.from_enc, args.to_enc, skip_valid=args.skip_valid
+        )
+        if status == "failed":
             sys.exit(1)
-        for filename in os.listdir(path):
-            file_path = os.path.join(path, filename)
-            if os.path.isfile(file_path):
-                convert_text_file_encoding(file_path, from_enc, to_enc)
     else:
-        print("Invalid mode. Use -f for file or -d for directory.")
-        sys.exit(1)
+        if not os.path.isdir(args.path):
+            print(get_logging_string("ERROR", "Directory not found"))
+            sys.exit(1)
+        convert_directory_encoding(
+            args.path, args.from_enc, args.to_enc, args.workers, args.skip_valid
+        )
 
     print("Complete!")